@@ -8,17 +8,40 @@ from datetime import datetime, timedelta, timezone
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
+from matplotlib.collections import PolyCollection
+import numpy as np
 import pandas as pd
 
 
-def load_latency_window(db_path, iface, minutes, host=None):
-    """Load a recent latency window for one interface (and optional host)."""
-    since = datetime.now(timezone.utc) - timedelta(minutes=minutes)
+def open_reader(db_path):
+    """Open the single connection reused by every refresh (read-only by pragma)."""
     con = sqlite3.connect(db_path)
-    q = """
-      SELECT ts_utc, host, iface,
+    con.execute("PRAGMA query_only=1;")
+    return con
+
+
+_LATENCY_COLS = """
+      SELECT rowid AS rid, ts_utc, host, iface,
              ping_ms, ping_min_ms, ping_avg_ms, ping_max_ms, ping_jitter_ms, ping_loss_pct,
              dns_ms, avail_ok
+"""
+_NUMERIC_COLS = ["ping_ms", "ping_min_ms", "ping_avg_ms", "ping_max_ms", "ping_jitter_ms",
+                 "ping_loss_pct", "dns_ms", "avail_ok"]
+
+
+def _finish_frame(df):
+    if df.empty:
+        return df
+    # All-NULL columns come back as object; keep dtypes stable so appends don't upcast.
+    df[_NUMERIC_COLS] = df[_NUMERIC_COLS].astype("float64")
+    df["ts"] = pd.to_datetime(df["ts_utc"], format="ISO8601", utc=True, cache=True)
+    return df
+
+
+def load_latency_window(con, iface, minutes, host=None):
+    """Load a recent latency window for one interface (and optional host)."""
+    since = datetime.now(timezone.utc) - timedelta(minutes=minutes)
+    q = _LATENCY_COLS + """
       FROM net_metrics
       WHERE ts_utc >= ? AND iface = ?
     """
@@ -28,28 +51,63 @@ def load_latency_window(db_path, iface, minutes, host=None):
         params.append(host)
     q += " ORDER BY ts_utc ASC"
 
-    try:
-        df = pd.read_sql_query(q, con, params=params)
-    finally:
-        con.close()
+    return _finish_frame(pd.read_sql_query(q, con, params=params))
 
-    if df.empty:
-        return df
 
-    df["ts"] = pd.to_datetime(df["ts_utc"], utc=True).dt.tz_convert("UTC")
-    return df
+def load_latency_since(con, iface, after_rowid, host=None):
+    """Load rows for one interface (and optional host) inserted after a known rowid."""
+    # NOT INDEXED keeps the planner on the rowid range instead of scanning the iface index.
+    q = _LATENCY_COLS + """
+      FROM net_metrics NOT INDEXED
+      WHERE rowid > ? AND iface = ?
+    """
+    params = [after_rowid, iface]
+    if host:
+        q += " AND host = ?"
+        params.append(host)
+    q += " ORDER BY rowid ASC"
+
+    return _finish_frame(pd.read_sql_query(q, con, params=params))
+
+
+def update_latency_window(con, cached, iface, minutes, host=None):
+    """Append rows logged since the previous refresh and drop rows older than the window."""
+    if cached is None or cached.empty:
+        return load_latency_window(con, iface, minutes, host)
 
+    new = load_latency_since(con, iface, int(cached["rid"].max()), host)
+    df = cached
+    if not new.empty:
+        # Buffered writers can commit out of ts order, so re-sort after appending.
+        df = pd.concat([cached, new], ignore_index=True).sort_values("ts", kind="stable", ignore_index=True)
+    cutoff = pd.Timestamp.now(tz="UTC") - pd.Timedelta(minutes=minutes)
+    return df[df["ts"] >= cutoff].reset_index(drop=True)
 
-def set_line(line, x, series):
+
+def set_line(line, x, values, has_data):
     """Update a matplotlib line with new data or hide it when no data."""
-    if series is not None and not series.empty and pd.notna(series).any():
-        line.set_data(x, series)
+    if has_data:
+        line.set_data(x, values)
         line.set_visible(True)
     else:
         line.set_data([], [])
         line.set_visible(False)
 
 
+def failure_spans(times, avail):
+    """Return shading rectangles (date x, axes-fraction y) for runs where avail_ok == 0."""
+    fail = avail.fillna(1).to_numpy() == 0
+    if not fail.any():
+        return []
+    x = mdates.date2num(times.to_numpy(dtype="datetime64[ns]"))
+    prev = np.concatenate(([False], fail[:-1]))
+    nxt = np.concatenate((fail[1:], [False]))
+    starts = np.flatnonzero(fail & ~prev)
+    # step="post": a failed sample stays shaded until the next sample arrives.
+    ends = np.minimum(np.flatnonzero(fail & ~nxt) + 1, len(x) - 1)
+    return [[(x[a], 0), (x[a], 1), (x[b], 1), (x[b], 0)] for a, b in zip(starts, ends)]
+
+
 def main():
     ap = argparse.ArgumentParser(description="Display latency metrics in real time.")
     ap.add_argument("--db", default="netstats.db", help="SQLite DB path")
@@ -75,21 +133,21 @@ def main():
     fig.autofmt_xdate()
 
     title_base = f"Live Latency | iface={args.iface} host={args.host or 'any'} | window={args.minutes} min"
-    avail_fill = None
+    # Created once; each frame only swaps its vertices.
+    avail_fill = PolyCollection([], transform=ax.get_xaxis_transform(), color="red", alpha=0.08, zorder=0)
+    ax.add_collection(avail_fill, autolim=False)
+    con = open_reader(args.db)
+    window = None
 
     def refresh(_frame):
-        nonlocal avail_fill
-        df = load_latency_window(args.db, args.iface, args.minutes, args.host or None)
-
-        if avail_fill:
-            avail_fill.remove()
-            avail_fill = None
+        nonlocal window
+        window = update_latency_window(con, window, args.iface, args.minutes, args.host or None)
+        df = window
 
         if df.empty:
-            set_line(ping_line, [], None)
-            set_line(jitter_line, [], None)
-            set_line(dns_line, [], None)
-            set_line(loss_line, [], None)
+            avail_fill.set_verts([])
+            for line in (ping_line, jitter_line, dns_line, loss_line):
+                set_line(line, [], None, False)
             now = datetime.now(timezone.utc)
             ax.set_xlim(now - timedelta(minutes=args.minutes), now)
             ax.set_title(title_base + " (waiting for data)")
@@ -97,11 +155,14 @@ def main():
             return ping_line, jitter_line, dns_line, loss_line
 
         times = df["ts"]
-        ping_series = df["ping_avg_ms"] if "ping_avg_ms" in df else df.get("ping_ms")
-        set_line(ping_line, times, ping_series)
-        set_line(jitter_line, times, df.get("ping_jitter_ms"))
-        set_line(dns_line, times, df.get("dns_ms"))
-        set_line(loss_line, times, df.get("ping_loss_pct"))
+        ping_col = "ping_avg_ms" if "ping_avg_ms" in df else "ping_ms"
+        # One NaN scan per column per frame, shared by set_line and the title.
+        values = {col: df[col].to_numpy() for col in (ping_col, "ping_jitter_ms", "dns_ms", "ping_loss_pct")}
+        valid = {col: pd.notna(arr) for col, arr in values.items()}
+        has = {col: bool(mask.any()) for col, mask in valid.items()}
+        for line, col in ((ping_line, ping_col), (jitter_line, "ping_jitter_ms"),
+                          (dns_line, "dns_ms"), (loss_line, "ping_loss_pct")):
+            set_line(line, times, values[col], has[col])
 
         end_ts = times.iloc[-1]
         start_ts = end_ts - pd.Timedelta(minutes=args.minutes)
@@ -117,22 +178,9 @@ def main():
             ax2.set_ylim(0, 1)
             ax2.set_yticks([])
 
-        if "avail_ok" in df.columns and df["avail_ok"].notna().any():
-            ymin, ymax = ax.get_ylim()
-            avail_fill = ax.fill_between(
-                times,
-                ymin,
-                ymax,
-                where=df["avail_ok"].fillna(1) == 0,
-                step="post",
-                color="red",
-                alpha=0.08,
-                zorder=0,
-            )
-
-        latest_ping = None
-        if ping_series is not None and pd.notna(ping_series).any():
-            latest_ping = ping_series[pd.notna(ping_series)].iloc[-1]
+        avail_fill.set_verts(failure_spans(times, df["avail_ok"]))
+
+        latest_ping = values[ping_col][valid[ping_col]][-1] if has[ping_col] else None
         title = title_base if latest_ping is None else f"{title_base} | latest={latest_ping:.1f} ms"
         ax.set_title(title)
 
@@ -151,8 +199,11 @@ def main():
         return ping_line, jitter_line, dns_line, loss_line
 
     print(f"[net_latency_live] Watching {args.db} every {args.refresh}s. Close the window or Ctrl+C to exit.")
-    anim = FuncAnimation(fig, refresh, interval=args.refresh * 1000)
-    plt.show()
+    anim = FuncAnimation(fig, refresh, interval=args.refresh * 1000, cache_frame_data=False)
+    try:
+        plt.show()
+    finally:
+        con.close()
     return anim
 
 
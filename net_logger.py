@@ -21,8 +21,11 @@ Usage examples:
   # Lighter throughput cadence + retention
   python net_logger.py --iperf iperf.he.net --throughput-every 6 --keep-days 7
 """
-import argparse, sqlite3, time, socket, subprocess, sys, platform, shutil, json
-from datetime import datetime, timezone, timedelta
+import argparse, sqlite3, time, socket, subprocess, sys, platform, shutil, json, re, os, uuid, operator, struct, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime, timezone
 
 # ---- deps ----
 try:
@@ -36,15 +39,65 @@ try:
 except Exception:
     requests = None
 
-
-# ---- helpers ----
-def now_utc_iso():
-    return datetime.now(timezone.utc).isoformat()
+_IPERF_LIB = False  # not probed yet; None once we know libiperf isn't usable
+_THR_STOP = threading.Event()  # set on shutdown so an in-flight throughput test gives up early
 
 
-def _table_has_column(conn, table, col):
-    cur = conn.execute(f"PRAGMA table_info({table});")
-    return any(r[1] == col for r in cur.fetchall())
+# ---- helpers ----
+def now_utc_stamp():
+    """Return (ISO-8601 text, integer epoch microseconds) for the same instant."""
+    t = time.time()
+    return datetime.fromtimestamp(t, timezone.utc).isoformat(), int(t * 1_000_000)
+
+
+def tune_connection(conn):
+    """WAL + NORMAL sync: cheaper commits, and readers no longer block the writer."""
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA cache_size=-20000;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA mmap_size=268435456;")  # 256 MiB: index lookups for pruning read pages via mmap
+
+
+@contextmanager
+def write_txn(conn):
+    """Explicit BEGIN IMMEDIATE ... COMMIT: takes the write lock up front (waiting out busy
+    readers via the connection timeout) instead of upgrading a deferred transaction mid-batch."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+
+# Columns added after the original schema; ensure_schema ALTERs in any that are missing.
+ADD_COLUMNS = (
+    ("thr_down_mbps", "REAL"),
+    ("thr_up_mbps", "REAL"),
+    ("thr_jitter_ms", "REAL"),
+    ("thr_loss_pct", "REAL"),
+    ("thr_method", "TEXT"),
+    ("ping_min_ms", "REAL"),
+    ("ping_avg_ms", "REAL"),
+    ("ping_max_ms", "REAL"),
+    ("ping_jitter_ms", "REAL"),
+    ("ping_loss_pct", "REAL"),
+    ("avail_ok", "INTEGER"),
+    ("errin_delta", "INTEGER"),
+    ("errout_delta", "INTEGER"),
+    ("dropin_delta", "INTEGER"),
+    ("dropout_delta", "INTEGER"),
+    ("isup", "INTEGER"),
+    ("speed_mbps", "INTEGER"),
+    ("duplex", "TEXT"),
+    ("mtu", "INTEGER"),
+    ("ip4", "TEXT"),
+    ("mac", "TEXT"),
+    ("ts_us", "INTEGER"),
+)
 
 
 def ensure_schema(conn):
@@ -70,65 +123,31 @@ def ensure_schema(conn):
     );
     """)
     # Add additional columns if missing
-    for col, typ in [
-        ("thr_down_mbps", "REAL"),
-        ("thr_up_mbps", "REAL"),
-        ("thr_jitter_ms", "REAL"),
-        ("thr_loss_pct", "REAL"),
-        ("thr_method", "TEXT"),
-        ("ping_min_ms", "REAL"),
-        ("ping_avg_ms", "REAL"),
-        ("ping_max_ms", "REAL"),
-        ("ping_jitter_ms", "REAL"),
-        ("ping_loss_pct", "REAL"),
-        ("avail_ok", "INTEGER"),
-        ("errin_delta", "INTEGER"),
-        ("errout_delta", "INTEGER"),
-        ("dropin_delta", "INTEGER"),
-        ("dropout_delta", "INTEGER"),
-        ("isup", "INTEGER"),
-        ("speed_mbps", "INTEGER"),
-        ("duplex", "TEXT"),
-        ("mtu", "INTEGER"),
-        ("ip4", "TEXT"),
-        ("mac", "TEXT"),
-    ]:
-        if not _table_has_column(conn, "net_metrics", col):
+    existing = {r[1] for r in conn.execute("PRAGMA table_info(net_metrics);").fetchall()}
+    for col, typ in ADD_COLUMNS:
+        if col not in existing:
             conn.execute(f"ALTER TABLE net_metrics ADD COLUMN {col} {typ};")
+    if "ts_us" not in existing:
+        # One-off backfill so retention can key off the integer column for old rows too.
+        conn.execute("""
+            UPDATE net_metrics
+            SET ts_us = CAST(round((julianday(ts_utc) - 2440587.5) * 86400000000.0) AS INTEGER)
+            WHERE ts_us IS NULL
+        """)
     conn.execute("CREATE INDEX IF NOT EXISTS idx_net_metrics_ts ON net_metrics(ts_utc);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_net_metrics_iface_ts ON net_metrics(iface, ts_utc);")
+    # Viewer/report queries with --host filter on iface + host and read in ts order.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_net_metrics_iface_host_ts ON net_metrics(iface, host, ts_utc);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_net_metrics_ts_us ON net_metrics(ts_us);")
     conn.commit()
 
 
-def ping_stats(target, timeout=2, count=3):
-    """Send multiple probes; return min/avg/max/jitter and loss%."""
-    system = platform.system()
-    base_cmd = ["ping", "-n", "1", "-w", str(int(timeout * 1000)), target] if system == "Windows" \
-               else ["ping", "-c", "1", "-W", str(int(timeout)), target]
-    samples = []
+# Reply lines carry a TTL; the first "=<n>ms"/"<<n>ms" on them is the RTT (any locale).
+# Matched on raw bytes: no decode per run, and OEM/localized console encodings can't break it.
+_PING_RTT_RE = re.compile(rb"^(?=.*ttl)[^\n]*?[=<]\s*(\d+(?:\.\d+)?)\s*ms", re.IGNORECASE | re.MULTILINE)
 
-    for _ in range(max(1, count)):
-        try:
-            start = time.perf_counter()
-            out = subprocess.run(base_cmd, capture_output=True, text=True, timeout=timeout + 1)
-            elapsed_ms = (time.perf_counter() - start) * 1000.0
-            if out.returncode == 0:
-                text = out.stdout
-                found = None
-                for tok in text.replace("=", " ").replace("<", " ").split():
-                    if tok.lower().endswith("ms"):
-                        num = tok[:-2]
-                        if num.replace(".", "", 1).isdigit():
-                            try:
-                                found = float(num)
-                                break
-                            except ValueError:
-                                pass
-                samples.append(found if found is not None else elapsed_ms)
-        except Exception:
-            pass
-        time.sleep(0.05)
-
-    sent = max(1, count)
+
+def _ping_summary(samples, sent):
     received = len(samples)
     if received == 0:
         return None
@@ -148,13 +167,165 @@ def ping_stats(target, timeout=2, count=3):
     }
 
 
-def dns_lookup_ms(hostname):
-    start = time.perf_counter()
+# One ICMP socket for the life of the process; None once we know we can't open one.
+_icmp = {"sock": False, "seq": 0, "addrs": {}}
+_ICMP_PAYLOAD = bytes(32)
+
+
+def _icmp_checksum(data):
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _icmp_socket():
+    """Unprivileged ICMP datagram socket if allowed, else raw (root/CAP_NET_RAW), else None."""
+    if _icmp["sock"] is False:
+        _icmp["sock"] = None
+        if platform.system() != "Windows":
+            for kind in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+                try:
+                    _icmp["sock"] = socket.socket(socket.AF_INET, kind, socket.IPPROTO_ICMP)
+                    break
+                except OSError:
+                    pass
+    return _icmp["sock"]
+
+
+def icmp_ping_stats(sock, target, timeout=2, count=3):
+    """Echo `count` times over the shared ICMP socket; same result shape as ping_stats."""
+    addr = _icmp["addrs"].get(target)
+    if addr is None:
+        addr = _icmp["addrs"][target] = socket.gethostbyname(target)
+    ident = os.getpid() & 0xFFFF
+    samples = []
+    for _ in range(count):
+        _icmp["seq"] = seq = (_icmp["seq"] + 1) & 0xFFFF
+        header = struct.pack("!BBHHH", 8, 0, 0, ident, seq)
+        packet = struct.pack("!BBHHH", 8, 0, _icmp_checksum(header + _ICMP_PAYLOAD), ident, seq) + _ICMP_PAYLOAD
+        start = time.perf_counter_ns()
+        deadline = start + int(timeout * 1e9)
+        sock.sendto(packet, (addr, 0))
+        while True:
+            remaining = (deadline - time.perf_counter_ns()) / 1e9
+            if remaining <= 0:
+                break
+            sock.settimeout(remaining)
+            try:
+                data, peer = sock.recvfrom(2048)
+            except socket.timeout:
+                break
+            now = time.perf_counter_ns()
+            if data and data[0] >> 4 == 4:  # raw sockets (and macOS datagram ones) include the IP header
+                data = data[(data[0] & 0x0F) * 4:]
+            if len(data) < 8 or peer[0] != addr:
+                continue
+            r_type, _, _, r_id, r_seq = struct.unpack("!BBHHH", data[:8])
+            # Datagram sockets rewrite the id to the local port and filter for us; only seq is reliable there.
+            if r_type == 0 and r_seq == seq and (sock.type == socket.SOCK_DGRAM or r_id == ident):
+                samples.append((now - start) / 1e6)
+                break
+    return _ping_summary(samples, count)
+
+
+_PING_ARGV = {}
+
+
+def _ping_argv(count, timeout):
+    """System ping argv (minus target), with the binary path resolved once per count/timeout."""
+    argv = _PING_ARGV.get((count, timeout))
+    if argv is None:
+        exe = shutil.which("ping") or "ping"
+        system = platform.system()
+        if system == "Windows":
+            argv = [exe, "-n", str(count), "-w", str(int(timeout * 1000))]
+        elif system == "Linux":
+            argv = [exe, "-c", str(count), "-i", "0.2", "-W", str(int(timeout))]
+        else:
+            argv = [exe, "-c", str(count), "-W", str(int(timeout))]
+        _PING_ARGV[(count, timeout)] = argv
+    return argv
+
+
+def ping_stats(target, timeout=2, count=3):
+    """Send multiple probes; return min/avg/max/jitter and loss%.
+
+    Uses a persistent in-process ICMP socket when the OS allows one, else a single ping run.
+    """
+    count = max(1, count)
+    sock = _icmp_socket()
+    if sock is not None:
+        try:
+            return icmp_ping_stats(sock, target, timeout=timeout, count=count)
+        except OSError:
+            return None
+    cmd = _ping_argv(count, timeout) + [target]
+    samples = []
+
     try:
-        socket.gethostbyname(hostname)
-        return (time.perf_counter() - start) * 1000.0
+        out = subprocess.run(cmd, capture_output=True, timeout=count * (timeout + 1) + 1)
+        samples = [float(v) for v in _PING_RTT_RE.findall(out.stdout)]
     except Exception:
+        pass
+
+    return _ping_summary(samples, count)
+
+
+def open_dns_socket(resolver):
+    """UDP socket connected to resolver:53, reused for every query."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect((resolver, 53))
+    return sock
+
+
+def _udp_dns_lookup_ms(sock, name, nocache, timeout=2.0):
+    """Send one A query on the connected socket; wire RTT in ms, or None."""
+    qid = int.from_bytes(os.urandom(2), "big")
+    start = time.perf_counter_ns()
+    deadline = start + int(timeout * 1e9)
+    try:
+        # Encoding can reject the name (empty/oversized label); that's a failed lookup, like any other.
+        qname = b"".join(bytes([len(label)]) + label for label in name.encode("idna").split(b".") if label)
+        query = struct.pack("!HHHHHH", qid, 0x0100, 1, 0, 0, 0) + qname + b"\0" + struct.pack("!HH", 1, 1)
+        sock.send(query)
+        while True:
+            remaining = (deadline - time.perf_counter_ns()) / 1e9
+            if remaining <= 0:
+                return None
+            sock.settimeout(remaining)
+            reply = sock.recv(512)
+            # Skip late answers to earlier (timed-out) queries.
+            if len(reply) >= 12 and int.from_bytes(reply[:2], "big") == qid:
+                break
+    except (OSError, UnicodeError, ValueError):
         return None
+    elapsed = (time.perf_counter_ns() - start) / 1e6
+    rcode = reply[3] & 0x0F
+    # A random label normally doesn't exist: NXDOMAIN still means the resolver answered.
+    return elapsed if rcode == 0 or (nocache and rcode == 3) else None
+
+
+def dns_lookup_ms(hostname, nocache=False, resolver_sock=None):
+    """Time one resolver lookup. nocache queries a random subdomain so caches can't answer it.
+
+    With resolver_sock, query that resolver directly over UDP instead of the system resolver.
+    """
+    name = f"{uuid.uuid4().hex}.{hostname}" if nocache else hostname
+    if resolver_sock is not None:
+        return _udp_dns_lookup_ms(resolver_sock, name, nocache)
+    start = time.perf_counter_ns()
+    try:
+        socket.getaddrinfo(name, None, 0, socket.SOCK_DGRAM, 0, socket.AI_NUMERICSERV)
+    except socket.gaierror as e:
+        # A random label normally doesn't exist: NXDOMAIN still means the resolver answered.
+        if not (nocache and e.errno in (socket.EAI_NONAME, getattr(socket, "EAI_NODATA", None))):
+            return None
+    except Exception:
+        return None
+    return (time.perf_counter_ns() - start) / 1e6
 
 
 def _duplex_name(val):
@@ -177,14 +348,28 @@ def _addr_info(addrs):
     return ip4, mac
 
 
-def aggregate_counters(pernic):
-    iface_stats = psutil.net_if_stats()
-    iface_addrs = psutil.net_if_addrs()
-    nic = psutil.net_io_counters(pernic=pernic)
-    rows, meta = {}, {}
-    if pernic:
-        for name, stats_row in nic.items():
-            rows[name] = stats_row
+_NO_META = {
+    "isup": None,
+    "speed_mbps": None,
+    "duplex": None,
+    "mtu": None,
+    "ip4": None,
+    "mac": None,
+}
+
+# IPs/MACs/MTU/link state change rarely and these are the slowest psutil calls (notably on Windows).
+_ifcache = {"meta": None, "t": 0.0}
+
+
+def iface_meta(refresh_secs=30.0):
+    """Return {iface: metadata dict}, re-reading and decoding psutil's view at most every refresh_secs."""
+    now = time.monotonic()
+    if _ifcache["meta"] is None or now - _ifcache["t"] > refresh_secs:
+        # Read both back to back and decode them once; ticks in between only do dict lookups.
+        iface_stats = psutil.net_if_stats()
+        iface_addrs = psutil.net_if_addrs()
+        meta = {}
+        for name in iface_stats.keys() | iface_addrs.keys():
             st = iface_stats.get(name)
             ip4, mac = _addr_info(iface_addrs.get(name, []))
             meta[name] = {
@@ -195,51 +380,108 @@ def aggregate_counters(pernic):
                 "ip4": ip4,
                 "mac": mac,
             }
-        # derive TOTAL
-        if nic:
-            sample = next(iter(nic.values()))
-            fields = sample._fields
-            totals = [sum(getattr(s, f, 0) for s in nic.values()) for f in fields]
-            total = sample.__class__(*totals)
-        else:
-            base = psutil.net_io_counters(pernic=False)
-            total = base.__class__(*([0] * len(base))) if base else None
-        rows["TOTAL"] = total
-        meta["TOTAL"] = {
-            "isup": None,
-            "speed_mbps": None,
-            "duplex": None,
-            "mtu": None,
-            "ip4": None,
-            "mac": None,
-        }
+        _ifcache["meta"] = meta
+        _ifcache["t"] = now
+    return _ifcache["meta"]
+
+
+def aggregate_counters(pernic, iface_refresh_secs=30.0):
+    if not pernic:
+        # TOTAL carries no interface metadata, so skip the if_stats/if_addrs calls entirely.
+        return {"TOTAL": psutil.net_io_counters(pernic=False)}, {"TOTAL": dict(_NO_META)}
+
+    known = iface_meta(iface_refresh_secs)
+    nic = psutil.net_io_counters(pernic=True)
+    rows, meta = dict(nic), {}
+    for name in nic:
+        meta[name] = known.get(name, _NO_META)
+    # derive TOTAL
+    if nic:
+        sample = next(iter(nic.values()))
+        # snetio is a namedtuple: transpose and sum positionally, no per-field getattr.
+        total = sample.__class__(*map(sum, zip(*nic.values())))
     else:
-        rows["TOTAL"] = nic  # single snetio
-        meta["TOTAL"] = {
-            "isup": None,
-            "speed_mbps": None,
-            "duplex": None,
-            "mtu": None,
-            "ip4": None,
-            "mac": None,
-        }
+        base = psutil.net_io_counters(pernic=False)
+        total = base.__class__(*([0] * len(base))) if base else None
+    rows["TOTAL"] = total
+    meta["TOTAL"] = dict(_NO_META)
     return rows, meta
 
 
-def rate(prev, curr, dt):
+def rate(delta, dt):
+    """bytes/packets sent/recv per second from a counter-delta tuple (snetio field order)."""
     if dt <= 0:
-        return {k: 0.0 for k in ("bytes_sent_rate", "bytes_recv_rate", "packets_sent_rate", "packets_recv_rate")}
-    return {
-        "bytes_sent_rate": (curr.bytes_sent - prev.bytes_sent) / dt,
-        "bytes_recv_rate": (curr.bytes_recv - prev.bytes_recv) / dt,
-        "packets_sent_rate": (curr.packets_sent - prev.packets_sent) / dt,
-        "packets_recv_rate": (curr.packets_recv - prev.packets_recv) / dt,
-    }
+        return (0.0, 0.0, 0.0, 0.0)
+    return tuple(d / dt for d in delta[:4])
 
 
 # ---- throughput tests ----
-def iperf3_throughput(server, duration=5, port=None, reverse=False, bidir=False):
-    """Return dict with down/up Mbps using iperf3 JSON output."""
+def _load_iperf_lib():
+    """Load libiperf via ctypes once; None if it (or a symbol we need) is missing."""
+    global _IPERF_LIB
+    if _IPERF_LIB is not False:
+        return _IPERF_LIB
+    _IPERF_LIB = None
+    try:
+        import ctypes, ctypes.util
+        lib = None
+        # find_library needs ldconfig/gcc, which slim images often lack; try the usual sonames too.
+        for name in (ctypes.util.find_library("iperf"), "libiperf.so.0", "libiperf.0.dylib", "iperf.dll"):
+            if not name:
+                continue
+            try:
+                lib = ctypes.CDLL(name)
+                break
+            except OSError:
+                pass
+        if lib is None:
+            return None
+        test_p = ctypes.c_void_p
+        lib.iperf_new_test.restype = test_p
+        for fn in ("iperf_defaults", "iperf_run_client", "iperf_free_test", "iperf_get_test_json_output_string"):
+            getattr(lib, fn).argtypes = [test_p]
+        lib.iperf_get_test_json_output_string.restype = ctypes.c_char_p
+        lib.iperf_set_test_role.argtypes = [test_p, ctypes.c_char]
+        lib.iperf_set_test_server_hostname.argtypes = [test_p, ctypes.c_char_p]
+        lib.iperf_set_test_logfile.argtypes = [test_p, ctypes.c_char_p]
+        for fn in ("iperf_set_test_server_port", "iperf_set_test_duration",
+                   "iperf_set_test_reverse", "iperf_set_test_json_output"):
+            getattr(lib, fn).argtypes = [test_p, ctypes.c_int]
+        if hasattr(lib, "iperf_set_test_bidirectional"):  # iperf >= 3.7
+            lib.iperf_set_test_bidirectional.argtypes = [test_p, ctypes.c_int]
+        _IPERF_LIB = lib
+    except (OSError, AttributeError):
+        pass
+    return _IPERF_LIB
+
+
+def _iperf3_json_lib(lib, server, duration, port, reverse, bidir):
+    """Run one client test in-process; return the JSON result text or None."""
+    test = lib.iperf_new_test()
+    if not test:
+        return None
+    try:
+        lib.iperf_defaults(test)
+        lib.iperf_set_test_role(test, b"c")
+        lib.iperf_set_test_server_hostname(test, server.encode())
+        lib.iperf_set_test_server_port(test, int(port or 5201))
+        lib.iperf_set_test_duration(test, int(duration))
+        lib.iperf_set_test_reverse(test, 1 if reverse else 0)
+        if bidir:
+            lib.iperf_set_test_bidirectional(test, 1)
+        lib.iperf_set_test_json_output(test, 1)
+        # The library also writes the JSON to its log stream; keep that off our console.
+        lib.iperf_set_test_logfile(test, os.devnull.encode())
+        if lib.iperf_run_client(test) < 0:
+            return None
+        out = lib.iperf_get_test_json_output_string(test)
+        return out.decode() if out else None
+    finally:
+        lib.iperf_free_test(test)
+
+
+def _iperf3_json_cli(server, duration, port, reverse, bidir):
+    """Run one client test through the iperf3 binary; return the JSON result text or None."""
     if not shutil.which("iperf3"):
         return None
     base = ["iperf3", "-c", server, "-J", "-t", str(int(duration))]
@@ -249,11 +491,33 @@ def iperf3_throughput(server, duration=5, port=None, reverse=False, bidir=False)
         base += ["-R"]
     if bidir:
         base += ["--bidir"]
+    proc = subprocess.Popen(base, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    deadline = time.monotonic() + duration + 12
+    while True:
+        try:
+            out, _ = proc.communicate(timeout=0.5)
+            break
+        except subprocess.TimeoutExpired:
+            if _THR_STOP.is_set() or time.monotonic() >= deadline:
+                proc.kill()
+                proc.communicate()
+                return None
+    if proc.returncode != 0:
+        return None
+    return out
+
+
+def iperf3_throughput(server, duration=5, port=None, reverse=False, bidir=False):
+    """Return dict with down/up Mbps using iperf3 JSON output (libiperf if available, else the binary)."""
     try:
-        r = subprocess.run(base, capture_output=True, text=True, timeout=duration + 12)
-        if r.returncode != 0:
+        lib = _load_iperf_lib()
+        if lib is not None and (not bidir or hasattr(lib, "iperf_set_test_bidirectional")):
+            text = _iperf3_json_lib(lib, server, duration, port, reverse, bidir)
+        else:
+            text = _iperf3_json_cli(server, duration, port, reverse, bidir)
+        if text is None:
             return None
-        js = json.loads(r.stdout)
+        js = json.loads(text)
         end = js.get("end", {})
         sum_sent = end.get("sum_sent", {})        # client -> server (upload)
         sum_received = end.get("sum_received", {})  # server -> client (download when -R or bidir)
@@ -312,20 +576,25 @@ def http_download_throughput(url, seconds=5):
     """Best-effort HTTP download throughput (downlink only)."""
     if requests is None:
         return None
-    start = time.time()
+    start = time.monotonic()
+    deadline = start + seconds
     total = 0
+    # Read the undecoded body straight into one reusable buffer: no per-chunk bytes objects.
+    # Kept at 64 KiB because readinto blocks until the buffer fills; on a slow link a bigger
+    # one would overshoot the deadline and delay noticing a shutdown.
+    buf = memoryview(bytearray(1 << 16))
     try:
         with requests.get(url, stream=True, timeout=seconds + 8) as resp:
             resp.raise_for_status()
-            for chunk in resp.iter_content(chunk_size=128 * 1024):
-                if not chunk:
-                    continue
-                total += len(chunk)
-                if time.time() - start >= seconds:
+            readinto = resp.raw.readinto
+            while time.monotonic() < deadline and not _THR_STOP.is_set():
+                n = readinto(buf)
+                if not n:
                     break
+                total += n
     except Exception:
         return None
-    elapsed = time.time() - start
+    elapsed = time.monotonic() - start
     if elapsed <= 0:
         return None
     mbps = (total * 8) / 1e6 / elapsed
@@ -338,62 +607,142 @@ def http_download_throughput(url, seconds=5):
     }
 
 
+def run_throughput(args):
+    """Run one throughput test (prefer iperf if provided; else HTTP if provided)."""
+    thr = None
+    if args.iperf:
+        thr = iperf3_throughput(
+            args.iperf,
+            duration=args.iperf_duration,
+            port=args.iperf_port,
+            reverse=args.iperf_reverse,
+            bidir=args.iperf_bidir,
+        )
+    if thr is None and args.http_url:
+        thr = http_download_throughput(args.http_url, seconds=args.http_seconds)
+    return thr
+
+
 # ---- DB insert ----
-def insert_samples(conn, host, ts, rows, meta, prev_rows, dt, ping_stats_val, dns_val, thr, avail_ok):
-    with conn:
-        for iface, curr in rows.items():
-            prev = prev_rows.get(iface, curr)
-            rates = rate(prev, curr, dt)
-
-            # Only write throughput to TOTAL row
-            t_down = thr["thr_down_mbps"] if (thr and iface == "TOTAL") else None
-            t_up   = thr["thr_up_mbps"]   if (thr and iface == "TOTAL") else None
-            t_jit  = thr["thr_jitter_ms"] if (thr and iface == "TOTAL") else None
-            t_loss = thr["thr_loss_pct"]  if (thr and iface == "TOTAL") else None
-            t_meth = thr["thr_method"]    if (thr and iface == "TOTAL") else None
-            info = meta.get(iface, {})
-
-            errin_delta = max(int(curr.errin - prev.errin), 0)
-            errout_delta = max(int(curr.errout - prev.errout), 0)
-            dropin_delta = max(int(getattr(curr, "dropin", 0) - getattr(prev, "dropin", 0)), 0)
-            dropout_delta = max(int(getattr(curr, "dropout", 0) - getattr(prev, "dropout", 0)), 0)
-
-            ping_avg = ping_stats_val["avg_ms"] if (iface == "TOTAL" and ping_stats_val) else None
-            ping_min = ping_stats_val["min_ms"] if (iface == "TOTAL" and ping_stats_val) else None
-            ping_max = ping_stats_val["max_ms"] if (iface == "TOTAL" and ping_stats_val) else None
-            ping_jit = ping_stats_val["jitter_ms"] if (iface == "TOTAL" and ping_stats_val) else None
-            ping_loss = ping_stats_val["loss_pct"] if (iface == "TOTAL" and ping_stats_val) else None
-            avail_val = int(bool(avail_ok)) if (iface == "TOTAL" and avail_ok is not None) else None
-
-            placeholders = ",".join(["?"] * 38)
-            conn.execute(f"""
-            INSERT INTO net_metrics(
-                ts_utc, host, iface,
-                bytes_sent, bytes_recv, packets_sent, packets_recv,
-                errin, errout, dropin, dropout,
-                bytes_sent_rate, bytes_recv_rate, packets_sent_rate, packets_recv_rate,
-                ping_ms, dns_ms,
-                thr_down_mbps, thr_up_mbps, thr_jitter_ms, thr_loss_pct, thr_method,
-                ping_min_ms, ping_avg_ms, ping_max_ms, ping_jitter_ms, ping_loss_pct,
-                avail_ok, errin_delta, errout_delta, dropin_delta, dropout_delta,
-                isup, speed_mbps, duplex, mtu, ip4, mac
-            ) VALUES ({placeholders})
-            """, (
-                ts, host, iface,
-                int(curr.bytes_sent), int(curr.bytes_recv),
-                int(curr.packets_sent), int(curr.packets_recv),
-                int(curr.errin), int(curr.errout),
-                int(getattr(curr, "dropin", 0)), int(getattr(curr, "dropout", 0)),
-                float(rates["bytes_sent_rate"]), float(rates["bytes_recv_rate"]),
-                float(rates["packets_sent_rate"]), float(rates["packets_recv_rate"]),
-                None if iface != "TOTAL" else (None if ping_avg is None else float(ping_avg)),
-                None if iface != "TOTAL" else (None if dns_val is None else float(dns_val)),
-                t_down, t_up, t_jit, t_loss, t_meth,
-                ping_min, ping_avg, ping_max, ping_jit, ping_loss,
-                avail_val, errin_delta, errout_delta, dropin_delta, dropout_delta,
-                info.get("isup"), info.get("speed_mbps"), info.get("duplex"), info.get("mtu"),
-                info.get("ip4"), info.get("mac")
-            ))
+_COLUMNS = (
+    "ts_utc", "host", "iface",
+    "bytes_sent", "bytes_recv", "packets_sent", "packets_recv",
+    "errin", "errout", "dropin", "dropout",
+    "bytes_sent_rate", "bytes_recv_rate", "packets_sent_rate", "packets_recv_rate",
+    "ping_ms", "dns_ms",
+    "thr_down_mbps", "thr_up_mbps", "thr_jitter_ms", "thr_loss_pct", "thr_method",
+    "ping_min_ms", "ping_avg_ms", "ping_max_ms", "ping_jitter_ms", "ping_loss_pct",
+    "avail_ok", "errin_delta", "errout_delta", "dropin_delta", "dropout_delta",
+    "isup", "speed_mbps", "duplex", "mtu", "ip4", "mac", "ts_us",
+)
+assert len(_COLUMNS) == 39, "sample_rows builds 39-value tuples; keep _COLUMNS in step"
+_INSERT_SQL = f"INSERT INTO net_metrics({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+
+
+_NO_PROBES = (None,) * 13
+
+
+def probe_columns(ping_stats_val, dns_val, thr, avail_ok):
+    """TOTAL-only columns (ping_ms .. avail_ok in _COLUMNS order), built once per tick."""
+    ping = ping_stats_val or {}
+    thr = thr or {}
+    ping_avg = ping.get("avg_ms")
+    return (
+        ping_avg,
+        dns_val,
+        thr.get("thr_down_mbps"), thr.get("thr_up_mbps"), thr.get("thr_jitter_ms"),
+        thr.get("thr_loss_pct"), thr.get("thr_method"),
+        ping.get("min_ms"), ping_avg, ping.get("max_ms"), ping.get("jitter_ms"), ping.get("loss_pct"),
+        None if avail_ok is None else int(bool(avail_ok)),
+    )
+
+
+# The eight snetio counters in _COLUMNS order, fetched in one C-level call.
+_COUNTERS = operator.attrgetter("bytes_sent", "bytes_recv", "packets_sent", "packets_recv",
+                                "errin", "errout", "dropin", "dropout")
+
+
+def _row_tuple(host, ts, ts_us, iface, curr, prev, dt, info, probes):
+    """One net_metrics parameter tuple, in _COLUMNS order."""
+    # All eight snetio counters differenced in one pass; rates and error deltas slice from it.
+    delta = tuple(map(operator.sub, curr, prev))
+    errin_delta, errout_delta, dropin_delta, dropout_delta = (max(d, 0) for d in delta[4:8])
+    return (
+        ts, host, iface,
+        # psutil counters are ints and rate() returns floats; sqlite3 binds both natively.
+        *_COUNTERS(curr),
+        *rate(delta, dt),
+        *probes,
+        errin_delta, errout_delta, dropin_delta, dropout_delta,
+        info.get("isup"), info.get("speed_mbps"), info.get("duplex"), info.get("mtu"),
+        info.get("ip4"), info.get("mac"), ts_us,
+    )
+
+
+def sample_rows(host, ts, ts_us, rows, meta, prev_rows, dt, ping_stats_val, dns_val, thr, avail_ok):
+    """Build one net_metrics parameter tuple per interface for this tick."""
+    # Ping/DNS/throughput/availability only go on the TOTAL row; resolve them once, not per column per iface.
+    total_probes = probe_columns(ping_stats_val, dns_val, thr, avail_ok)
+    return [
+        _row_tuple(host, ts, ts_us, iface, curr, prev_rows.get(iface, curr), dt, meta.get(iface, {}),
+                   total_probes if iface == "TOTAL" else _NO_PROBES)
+        for iface, curr in rows.items()
+    ]
+
+
+MAX_PENDING_ROWS = 100_000
+
+
+def insert_samples(conn, pending):
+    """Write buffered rows in a single transaction (one commit/fsync per flush)."""
+    if not pending:
+        return
+    with write_txn(conn):
+        conn.executemany(_INSERT_SQL, pending)
+    pending.clear()
+
+
+PRUNE_EVERY_SECS = 3600
+
+
+def prune_old(conn, keep_days, batch=5000):
+    """Delete rows older than keep_days in short transactions so inserts aren't held off."""
+    cutoff = int((time.time() - keep_days * 86400) * 1_000_000)
+    while True:
+        with write_txn(conn):
+            cur = conn.execute(
+                "DELETE FROM net_metrics WHERE rowid IN "
+                "(SELECT rowid FROM net_metrics WHERE ts_us < ? LIMIT ?)",
+                (cutoff, batch),
+            )
+        if cur.rowcount < batch:
+            break
+
+
+_HB_FMT = "{} up={} B/s ping={} ms jitter={} ms loss={}% dns={} ms thr={} Mb/s ({}) avail={}\n"
+
+
+def _r1(val):
+    return None if val is None else round(val, 1)
+
+
+def heartbeat(ts, up_rate, p_stats, d_ms, thr, avail_ok):
+    """Write the one-line TOTAL summary for this tick (flushing is left to the caller)."""
+    thr_str, method = "None", None
+    if thr:
+        down, up = thr.get("thr_down_mbps"), thr.get("thr_up_mbps")
+        if down is not None and up is not None:
+            thr_str = f"{round(down, 1)}↓/{round(up, 1)}↑"
+        elif down is not None:
+            thr_str = f"{round(down, 1)}↓"
+        elif up is not None:
+            thr_str = f"{round(up, 1)}↑"
+        method = thr.get("thr_method")
+    p_stats = p_stats or {}
+    sys.stdout.write(_HB_FMT.format(
+        ts, int(up_rate), _r1(p_stats.get("avg_ms")), _r1(p_stats.get("jitter_ms")), _r1(p_stats.get("loss_pct")),
+        _r1(d_ms), thr_str, method, "pending" if avail_ok is None else ("ok" if avail_ok else "fail"),
+    ))
 
 
 # ---- main ----
@@ -404,8 +753,13 @@ def main():
     ap.add_argument("--ping", default="8.8.8.8", help="Ping target (IP/hostname)")
     ap.add_argument("--ping-count", type=int, default=3, help="Number of ping probes per interval (>=1)")
     ap.add_argument("--dns", default="google.com", help="Hostname to resolve for DNS timing")
+    ap.add_argument("--dns-nocache", action="store_true",
+                    help="Resolve a random subdomain of --dns each time so cached answers don't hide resolver latency")
+    ap.add_argument("--dns-resolver", help="Query this DNS server (IPv4) directly over UDP instead of the system resolver")
     ap.add_argument("--pernic", action="store_true", help="Log per-interface metrics as well as total")
     ap.add_argument("--host-label", default=socket.gethostname(), help="Override host label")
+    ap.add_argument("--iface-refresh-secs", type=float, default=30.0,
+                    help="Re-read interface state/addresses (isup, speed, MTU, IP, MAC) at most this often")
 
     # throughput options
     ap.add_argument("--iperf", help="iperf3 server to test against (TCP). Example: iperf.he.net")
@@ -417,80 +771,124 @@ def main():
     ap.add_argument("--http-seconds", type=int, default=5, help="HTTP download test duration seconds")
     ap.add_argument("--throughput-every", type=int, default=1, help="Run throughput test every N samples (0 disables throughput tests)")
     ap.add_argument("--keep-days", type=float, help="Prune DB rows older than this many days")
+    ap.add_argument("--flush-every", type=int, default=6, help="Commit buffered samples every N intervals (1 = every sample)")
 
     args = ap.parse_args()
+    if args.dns_resolver:
+        # Direct queries encode the name themselves; reject one that can't be sent up front.
+        try:
+            args.dns.encode("idna")
+        except UnicodeError as e:
+            ap.error(f"--dns {args.dns!r} is not a valid hostname for --dns-resolver ({e})")
 
-    conn = sqlite3.connect(args.db, timeout=10)
+    # Autocommit mode: write transactions are opened explicitly by write_txn.
+    conn = sqlite3.connect(args.db, timeout=10, isolation_level=None)
+    tune_connection(conn)
     ensure_schema(conn)
 
-    prev_rows, _ = aggregate_counters(pernic=args.pernic)
-    prev_t = time.perf_counter()
+    prev_rows, _ = aggregate_counters(pernic=args.pernic, iface_refresh_secs=args.iface_refresh_secs)
+    prev_t = time.perf_counter_ns()
     loop_count = 0
+    # Bounded: if the DB stays locked, the oldest buffered samples are dropped rather than growing forever.
+    pending = deque(maxlen=MAX_PENDING_ROWS)
+    executor = ThreadPoolExecutor(max_workers=1)
+    probe_pool = ThreadPoolExecutor(max_workers=2)
+    ping_future = dns_future = None
+    dns_sock = open_dns_socket(args.dns_resolver) if args.dns_resolver else None
+    thr_future = None
+    last_prune = None
+    last_flush = time.monotonic()
 
     print(f"[net_logger] DB={args.db} Interval={args.interval}s perNIC={args.pernic}. Ctrl+C to stop.")
     try:
+        next_t = time.monotonic() + args.interval
         while True:
-            time.sleep(args.interval)
+            # Sleep to a running deadline so slow ticks don't push every later sample back.
+            time.sleep(max(0.0, next_t - time.monotonic()))
+            next_t += args.interval
+            if next_t < time.monotonic() - args.interval:
+                print("[net_logger] Sampling fell more than one interval behind; resyncing.", file=sys.stderr)
+                next_t = time.monotonic() + args.interval
             loop_count += 1
-            ts = now_utc_iso()
-            t = time.perf_counter()
-            dt = t - prev_t
-            rows, meta = aggregate_counters(pernic=args.pernic)
-
-            p_stats = ping_stats(args.ping, count=max(1, args.ping_count))
-            d_ms = dns_lookup_ms(args.dns)
-            avail_ok = (p_stats is not None) and (d_ms is not None)
-
-            # optional throughput (prefer iperf if provided; else HTTP if provided)
+            ts, ts_us = now_utc_stamp()
+            t = time.perf_counter_ns()
+            dt = (t - prev_t) / 1e9
+            rows, meta = aggregate_counters(pernic=args.pernic, iface_refresh_secs=args.iface_refresh_secs)
+
+            # Ping and DNS run side by side on the probe pool. Wait at most half an interval so a dead
+            # link can't stall sampling; a probe that overruns keeps running and lands on a later tick.
+            if ping_future is None:
+                ping_future = probe_pool.submit(ping_stats, args.ping, count=max(1, args.ping_count))
+            if dns_future is None:
+                dns_future = probe_pool.submit(dns_lookup_ms, args.dns, nocache=args.dns_nocache,
+                                               resolver_sock=dns_sock)
+            wait((ping_future, dns_future), timeout=args.interval * 0.5)
+            p_stats = d_ms = None
+            # A probe that raised counts as one failed probe (None), not a reason to stop logging.
+            if ping_future.done():
+                try:
+                    p_stats = ping_future.result()
+                except Exception as e:
+                    print(f"[net_logger] Ping probe failed: {e!r}", file=sys.stderr)
+                ping_future = None
+            if dns_future.done():
+                try:
+                    d_ms = dns_future.result()
+                except Exception as e:
+                    print(f"[net_logger] DNS probe failed: {e!r}", file=sys.stderr)
+                dns_future = None
+            # Unknown (NULL) rather than "fail" while a probe is still outstanding.
+            avail_ok = None if (ping_future or dns_future) else (p_stats is not None) and (d_ms is not None)
+
+            # optional throughput runs on a worker so slow tests don't stretch the sample interval;
+            # the result is attached to whichever tick sees it finish.
             thr = None
             run_thr = args.throughput_every is not None and args.throughput_every != 0 \
                       and (loop_count % max(1, abs(args.throughput_every)) == 0)
-            if run_thr and args.iperf:
-                thr = iperf3_throughput(
-                    args.iperf,
-                    duration=args.iperf_duration,
-                    port=args.iperf_port,
-                    reverse=args.iperf_reverse,
-                    bidir=args.iperf_bidir,
-                ) or thr
-            if run_thr and thr is None and args.http_url:
-                thr = http_download_throughput(args.http_url, seconds=args.http_seconds)
-
-            insert_samples(conn, args.host_label, ts, rows, meta, prev_rows, dt, p_stats, d_ms, thr, avail_ok)
-
-            if args.keep_days:
-                cutoff = datetime.now(timezone.utc) - timedelta(days=args.keep_days)
-                with conn:
-                    conn.execute("DELETE FROM net_metrics WHERE ts_utc < ?", (cutoff.isoformat(),))
+            if run_thr and thr_future is None and (args.iperf or args.http_url):
+                thr_future = executor.submit(run_throughput, args)
+            if thr_future is not None and thr_future.done():
+                thr = thr_future.result()
+                thr_future = None
+
+            pending.extend(sample_rows(args.host_label, ts, ts_us, rows, meta, prev_rows, dt, p_stats, d_ms, thr, avail_ok))
+            if loop_count % max(1, args.flush_every) == 0:
+                try:
+                    insert_samples(conn, pending)
+                except sqlite3.OperationalError as e:
+                    print(f"[net_logger] Flush failed ({e}); keeping {len(pending)} rows for the next flush.",
+                          file=sys.stderr)
+
+            if args.keep_days and (last_prune is None or time.monotonic() - last_prune >= PRUNE_EVERY_SECS):
+                try:
+                    prune_old(conn, args.keep_days)
+                    last_prune = time.monotonic()
+                except sqlite3.OperationalError as e:
+                    # last_prune stays put, so the prune is retried on the next tick.
+                    print(f"[net_logger] Prune failed ({e}); will retry.", file=sys.stderr)
 
             # console heartbeat (TOTAL)
-            total = rows["TOTAL"]
-            up_rate = (total.bytes_sent - prev_rows["TOTAL"].bytes_sent) / max(dt, 1e-9)
-            thr_str = "None"
-            if thr:
-                parts = []
-                if thr.get("thr_down_mbps") is not None:
-                    parts.append(f"{round(thr['thr_down_mbps'],1)}↓")
-                if thr.get("thr_up_mbps") is not None:
-                    parts.append(f"{round(thr['thr_up_mbps'],1)}↑")
-                thr_str = "/".join(parts) if parts else "None"
-                method = thr.get("thr_method")
-            else:
-                method = None
-
-            ping_avg = None if p_stats is None else round(p_stats["avg_ms"], 1)
-            ping_jit = None if p_stats is None else round(p_stats["jitter_ms"], 1)
-            ping_loss = None if p_stats is None else round(p_stats["loss_pct"], 1)
-            availability = "ok" if avail_ok else "fail"
-
-            print(f"{ts} up={int(up_rate)} B/s ping={ping_avg} ms jitter={ping_jit} ms loss={ping_loss}% "
-                  f"dns={None if d_ms is None else round(d_ms,1)} ms thr={thr_str} Mb/s ({method}) avail={availability}")
+            up_rate = (rows["TOTAL"].bytes_sent - prev_rows["TOTAL"].bytes_sent) / max(dt, 1e-9)
+            heartbeat(ts, up_rate, p_stats, d_ms, thr, avail_ok)
+            if time.monotonic() - last_flush >= 1.0:
+                sys.stdout.flush()
+                last_flush = time.monotonic()
 
             prev_rows, prev_t = rows, t
     except KeyboardInterrupt:
         print("\n[net_logger] Stopped.")
     finally:
-        conn.close()
+        _THR_STOP.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        probe_pool.shutdown(wait=False, cancel_futures=True)
+        if dns_sock is not None:
+            dns_sock.close()
+        try:
+            insert_samples(conn, pending)
+        except sqlite3.OperationalError as e:
+            print(f"[net_logger] Final flush failed ({e}); dropped {len(pending)} buffered rows.", file=sys.stderr)
+        finally:
+            conn.close()
 
 
 if __name__ == "__main__":
@@ -6,8 +6,11 @@ import sqlite3
 from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any
 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.colors import Normalize
 
 
 def parse_args():
@@ -28,6 +31,10 @@ def parse_args():
     return ap.parse_args()
 
 
+# NULL-only columns would otherwise arrive as object.
+_QUALITY_DTYPES = {"latency_ms": "float64", "jitter_ms": "float64", "loss_pct": "float64"}
+
+
 def load_quality_data(db_path: str, iface: str, host: str, since_hours: float | None):
     clauses = ["iface = ?"]
     params: List[Any] = [iface]
@@ -40,29 +47,29 @@ def load_quality_data(db_path: str, iface: str, host: str, since_hours: float |
         params.append(since.isoformat())
 
     where = " AND ".join(clauses)
+    # Fetch only what the analysis uses; SQLite picks the latency source per row.
     q = f"""
-      SELECT ts_utc, host, iface,
-             ping_avg_ms, ping_ms, ping_jitter_ms, ping_loss_pct,
-             dns_ms, avail_ok
+      SELECT ts_utc,
+             COALESCE(ping_avg_ms, ping_ms) AS latency_ms,
+             ping_jitter_ms AS jitter_ms,
+             ping_loss_pct AS loss_pct
       FROM net_metrics
       WHERE {where}
       ORDER BY ts_utc ASC
     """
     con = sqlite3.connect(db_path)
     try:
-        df = pd.read_sql_query(q, con, params=params)
+        df = pd.read_sql_query(q, con, params=params, dtype=_QUALITY_DTYPES)
     finally:
         con.close()
 
     if df.empty:
         return df
 
-    df["ts"] = pd.to_datetime(df["ts_utc"], utc=True)
-    df["latency_ms"] = df["ping_avg_ms"].combine_first(df.get("ping_ms"))
-    df["jitter_ms"] = df.get("ping_jitter_ms")
-    df["loss_pct"] = df.get("ping_loss_pct")
-    df["hour"] = df["ts"].dt.hour
-    df["gap_s"] = df["ts"].diff().dt.total_seconds()
+    df["ts"] = pd.to_datetime(df.pop("ts_utc"), format="ISO8601", utc=True, cache=True)
+    ts_ns = df["ts"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    df["hour"] = ((ts_ns // 3_600_000_000_000) % 24).astype(np.int8)
+    df["gap_s"] = np.concatenate(([np.nan], np.diff(ts_ns) / 1e9))
     return df
 
 
@@ -114,7 +121,7 @@ def print_issue_histogram(df: pd.DataFrame, width: int = 40):
         print(f"  {hour:02d} | {bar:<{width}} | issues={issues:4d} rate={rate:5.1f}% samples={samples:5d}")
 
 
-def plot_daily_issue_lines(df: pd.DataFrame, days: int, out_path: str):
+def plot_daily_issue_lines(df: pd.DataFrame, days: int, out_path: str, iface: str):
     """Plot hourly issue rates for each of the last N days, colored per day."""
     if not out_path:
         return
@@ -129,19 +136,29 @@ def plot_daily_issue_lines(df: pd.DataFrame, days: int, out_path: str):
         return
 
     recent["date"] = recent["ts"].dt.date
-    fig, ax = plt.subplots(figsize=(10, 5))
+    # One pivot for all days, one artist for all lines: per-day ax.plot calls dominate long windows.
     hours = list(range(24))
+    rates = (recent.pivot_table(index="date", columns="hour", values="any_issue", aggfunc="mean", observed=True)
+             .reindex(columns=hours).fillna(0.0) * 100.0)
+    n_days = len(rates)
+    segments = np.stack([np.tile(np.arange(24, dtype=float), (n_days, 1)), rates.to_numpy(dtype=float)], axis=-1)
 
-    for date, sub in recent.groupby("date"):
-        rates = sub.groupby("hour")["any_issue"].mean().reindex(hours, fill_value=0.0) * 100.0
-        ax.plot(hours, rates, marker="o", label=str(date))
-
-    ax.set_title(f"Issues per Hour (last {days} days) | iface={recent['iface'].iat[0]}")
+    fig, ax = plt.subplots(figsize=(10, 5))
+    norm = Normalize(0, max(n_days - 1, 1))
+    lc = LineCollection(segments, array=np.arange(n_days), cmap="viridis", norm=norm)
+    ax.add_collection(lc)
+    ax.scatter(segments[..., 0].ravel(), segments[..., 1].ravel(), s=12,
+               c=np.repeat(np.arange(n_days), 24), cmap="viridis", norm=norm, zorder=3)
+    ax.autoscale()
+    cbar = fig.colorbar(lc, ax=ax, label="Date")
+    cbar.set_ticks(range(n_days))
+    cbar.set_ticklabels([str(d) for d in rates.index])
+
+    ax.set_title(f"Issues per Hour (last {days} days) | iface={iface}")
     ax.set_xlabel("Hour of day (UTC)")
     ax.set_ylabel("Issue rate (%)")
     ax.set_xticks(hours)
     ax.grid(True, alpha=0.3)
-    ax.legend(title="Date", fontsize="small")
     plt.tight_layout()
     plt.savefig(out_path, dpi=130)
     plt.close(fig)
@@ -152,39 +169,34 @@ def find_spans(df: pd.DataFrame, flag_col: str, value_col: str, median_gap: floa
     if df.empty or flag_col not in df:
         return []
     max_gap = (median_gap or 0) * max_gap_mult
-    spans = []
-    current = None
-
-    for row in df.itertuples():
-        ts = row.ts
-        flagged = getattr(row, flag_col)
-        val = getattr(row, value_col) if value_col in df.columns else None
-        if not flagged:
-            if current:
-                spans.append(current)
-                current = None
-            continue
-
-        if current is None:
-            current = {"start": ts, "end": ts, "max": val, "samples": 1}
-            continue
+    flags = df[flag_col].to_numpy(dtype=bool)
+    idx = np.flatnonzero(flags)
+    if idx.size == 0:
+        return []
 
-        gap = (ts - current["end"]).total_seconds()
-        if max_gap and gap > max_gap:
-            spans.append(current)
-            current = {"start": ts, "end": ts, "max": val, "samples": 1}
-        else:
-            current["end"] = ts
-            current["samples"] += 1
-            if val is not None:
-                current["max"] = max(current["max"], val) if current["max"] is not None else val
-
-    if current:
-        spans.append(current)
-
-    for span in spans:
-        dur = (span["end"] - span["start"]).total_seconds()
-        span["duration_s"] = dur if dur > 0 else (median_gap or 0)
+    # A span starts at the first flagged row, after any unflagged row, or after a too-long gap.
+    ts_ns = df["ts"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    breaks = np.ones(idx.size, dtype=bool)
+    breaks[1:] = np.diff(idx) > 1
+    if max_gap:
+        breaks[1:] |= np.diff(ts_ns[idx]) / 1e9 > max_gap
+    first = np.flatnonzero(breaks)
+    last = np.append(first[1:], idx.size) - 1
+    start_rows, end_rows = idx[first], idx[last]
+
+    if value_col in df.columns:
+        maxes = np.fmax.reduceat(df[value_col].to_numpy(dtype=float)[idx], first).tolist()
+    else:
+        maxes = [None] * first.size
+    durations = ((ts_ns[end_rows] - ts_ns[start_rows]) / 1e9).tolist()
+    starts = df["ts"].take(start_rows).tolist()
+    ends = df["ts"].take(end_rows).tolist()
+
+    spans = [
+        {"start": st, "end": en, "max": mx, "samples": n,
+         "duration_s": dur if dur > 0 else (median_gap or 0)}
+        for st, en, mx, n, dur in zip(starts, ends, maxes, (last - first + 1).tolist(), durations)
+    ]
     spans.sort(key=lambda s: (s["max"] if s["max"] is not None else 0, s["duration_s"]), reverse=True)
     return spans
 
@@ -193,13 +205,15 @@ def print_hourly_patterns(df: pd.DataFrame, value_col: str, flag_col: str, top_h
     if value_col not in df or df[value_col].dropna().empty:
         print(f"{label} patterns: no data")
         return
-    grouped = df.groupby("hour").agg(
+    by_hour = df.groupby("hour")
+    grouped = by_hour.agg(
         samples=(value_col, "count"),
         high_count=(flag_col, "sum"),
         high_rate=(flag_col, "mean"),
         median_val=(value_col, "median"),
-        p95_val=(value_col, lambda s: percentile(s, 95)),
     )
+    # Built-in grouped quantile (NaN-skipping) instead of a per-hour Python lambda.
+    grouped["p95_val"] = by_hour[value_col].quantile(0.95)
     grouped = grouped[grouped["samples"] > 0].sort_values("high_rate", ascending=False)
     print(f"{label} top hours (UTC):")
     for hour, row in grouped.head(top_hours).iterrows():
@@ -251,7 +265,7 @@ def main():
 
     print()
     print_issue_histogram(df)
-    plot_daily_issue_lines(df, args.compare_days, args.issues_plot)
+    plot_daily_issue_lines(df, args.compare_days, args.issues_plot, args.iface)
 
     spans = {
         "High latency": find_spans(df, "high_latency", "latency_ms", median_gap, args.max_gap_mult),
@@ -2,13 +2,30 @@
 """View and analyze traceroute history from the SQLite DB."""
 
 import argparse
+import os
 import sqlite3
 from datetime import datetime, timedelta, timezone
 
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 from matplotlib.ticker import FixedLocator
 
+# Fixed schema of the joined run/hop query; dtypes are set up front instead of inferred.
+_HOP_COLUMNS = ["run_id", "ts_utc", "host", "target", "exit_code", "hop_count",
+                "hop", "hop_host", "hop_ip", "rtt_ms1", "rtt_ms2", "rtt_ms3", "rtt_avg_ms", "status"]
+_HOP_DTYPES = {"hop": "int16", "rtt_ms1": "float64", "rtt_ms2": "float64",
+               "rtt_ms3": "float64", "rtt_avg_ms": "float64"}
+
+
+def open_reader(db_path):
+    """Single read-only connection for the whole view (mmap'd pages, larger page cache)."""
+    con = sqlite3.connect(db_path)
+    con.execute("PRAGMA query_only=1;")
+    con.execute("PRAGMA mmap_size=268435456;")
+    con.execute("PRAGMA cache_size=-20000;")
+    return con
+
 
 def default_target(con, host):
     q = "SELECT target FROM trace_runs"
@@ -21,8 +38,7 @@ def default_target(con, host):
     return row[0] if row else None
 
 
-def load_trace_data(db_path, target, host, since_hours, runs):
-    con = sqlite3.connect(db_path)
+def load_trace_data(con, target, host, since_hours, runs):
     try:
         where = []
         params = []
@@ -37,42 +53,49 @@ def load_trace_data(db_path, target, host, since_hours, runs):
             where.append("ts_utc >= ?")
             params.append(since.isoformat())
 
-        q = "SELECT id, ts_utc, host, target, exit_code, hop_count FROM trace_runs"
+        run_filter = " FROM trace_runs"
         if where:
-            q += " WHERE " + " AND ".join(where)
-        q += " ORDER BY ts_utc DESC"
+            run_filter += " WHERE " + " AND ".join(where)
+        run_filter += " ORDER BY ts_utc DESC"
         if runs:
-            q += " LIMIT ?"
+            run_filter += " LIMIT ?"
             params = params + [runs]
 
-        runs_df = pd.read_sql_query(q, con, params=params)
+        # One read snapshot for both queries so a run logged in between can't skew the window.
+        con.execute("BEGIN")
+        runs_df = pd.read_sql_query("SELECT id, ts_utc, host, target, exit_code, hop_count" + run_filter,
+                                    con, params=params)
         if runs_df.empty:
             return runs_df, pd.DataFrame()
 
-        run_ids = runs_df["id"].tolist()
-        placeholders = ",".join(["?"] * len(run_ids))
+        # Same run filter as a subquery: no client-side IN (?, ?, ...) list, whatever --runs is.
         q2 = f"""
           SELECT r.id AS run_id, r.ts_utc, r.host, r.target, r.exit_code, r.hop_count,
                  h.hop, h.hop_host, h.hop_ip, h.rtt_ms1, h.rtt_ms2, h.rtt_ms3, h.rtt_avg_ms, h.status
           FROM trace_runs r
           JOIN trace_hops h ON h.run_id = r.id
-          WHERE r.id IN ({placeholders})
+          WHERE r.id IN (SELECT id{run_filter})
           ORDER BY r.ts_utc ASC, h.hop ASC
         """
-        df = pd.read_sql_query(q2, con, params=run_ids)
+        rows = con.execute(q2, params).fetchall()
+        df = pd.DataFrame.from_records(rows, columns=_HOP_COLUMNS).astype(_HOP_DTYPES)
     finally:
-        con.close()
+        con.commit()  # end the read snapshot
 
+    # Parse each run's timestamp once (ISO8601 fast path) and share it with that run's hop rows.
+    runs_df["ts"] = pd.to_datetime(runs_df["ts_utc"], format="ISO8601", utc=True)
     if df.empty:
         return runs_df, df
 
-    df["ts"] = pd.to_datetime(df["ts_utc"], utc=True).dt.tz_convert("UTC")
-    if "rtt_avg_ms" not in df.columns or df["rtt_avg_ms"].isna().all():
-        df["rtt_avg_ms"] = df[["rtt_ms1", "rtt_ms2", "rtt_ms3"]].mean(axis=1)
-    else:
-        df["rtt_avg_ms"] = df["rtt_avg_ms"].fillna(
-            df[["rtt_ms1", "rtt_ms2", "rtt_ms3"]].mean(axis=1)
-        )
+    df["ts"] = df["run_id"].map(runs_df.set_index("id")["ts"])
+    # Fill missing averages from the per-probe RTTs, computing the mean only for those rows.
+    avg = df["rtt_avg_ms"].to_numpy(dtype=float, copy=True)
+    missing = np.isnan(avg)
+    if missing.any():
+        probes = df.loc[missing, ["rtt_ms1", "rtt_ms2", "rtt_ms3"]].to_numpy(dtype=float)
+        with np.errstate(invalid="ignore"):
+            avg[missing] = np.nansum(probes, axis=1) / (~np.isnan(probes)).sum(axis=1)
+    df["rtt_avg_ms"] = avg
     return runs_df, df
 
 
@@ -82,22 +105,19 @@ def maybe_save(path):
         plt.savefig(path, dpi=130)
 
 
-def _hop_identity(row):
-    ip = row.get("hop_ip")
-    if pd.notna(ip):
-        return str(ip)
-    if row.get("status") == "timeout":
-        return "*"
-    host = row.get("hop_host")
-    if pd.notna(host):
-        return str(host)
-    return "?"
-
-
 def build_route_keys(df):
-    ordered = df.sort_values(["run_id", "hop"]).copy()
-    ordered["hop_id"] = ordered.apply(_hop_identity, axis=1)
-    return ordered.groupby("run_id")["hop_id"].apply(tuple)
+    # Hop identity per row: IP, else "*" for timeouts, else hostname, else "?".
+    ordered = df.sort_values(["run_id", "hop"])
+    ip = ordered["hop_ip"]
+    host = ordered["hop_host"]
+    fallback = host.where(host.notna(), "?").astype(str).mask(ordered["status"].eq("timeout"), "*")
+    hop_id = ip.astype(str).where(ip.notna(), fallback)
+    # Intern hop identities as integer codes; a run's route key is the raw bytes of its code
+    # sequence, so keys hash/compare as one memcmp instead of a tuple of strings.
+    codes, labels = pd.factorize(hop_id.to_numpy(), sort=False)
+    run_ids, starts = np.unique(ordered["run_id"].to_numpy(), return_index=True)
+    keys = [c.tobytes() for c in np.split(codes.astype(np.intp), starts[1:])]
+    return pd.Series(keys, index=run_ids, dtype=object), labels
 
 
 def format_route_key(route_key, max_hops, max_len=120):
@@ -112,19 +132,17 @@ def format_route_key(route_key, max_hops, max_len=120):
     return text
 
 
-def annotate_routes(runs_df, route_keys):
-    runs_sorted = runs_df.copy()
-    runs_sorted["route_key"] = runs_sorted["id"].map(route_keys)
-    runs_sorted = runs_sorted.sort_values("ts_utc")
-
-    route_id_map = {}
-    route_ids = []
-    for key in runs_sorted["route_key"]:
-        if key not in route_id_map:
-            route_id_map[key] = len(route_id_map) + 1
-        route_ids.append(route_id_map[key])
+def annotate_routes(runs_df, route_keys, hop_labels):
+    runs_sorted = runs_df.sort_values("ts_utc")
+    # Runs with no hops recorded get the empty route.
+    keys = runs_sorted["id"].map(route_keys).fillna(b"")
 
-    runs_sorted["route_id"] = route_ids
+    # Route ids number distinct hop sequences in order of first appearance.
+    codes, uniques = pd.factorize(keys.to_numpy(), use_na_sentinel=False)
+    routes = [tuple(hop_labels[np.frombuffer(k, dtype=np.intp)].tolist()) for k in uniques]
+    runs_sorted["route_id"] = codes + 1
+    runs_sorted["route_key"] = [routes[c] for c in codes]
+    route_id_map = dict(zip(routes, range(1, len(routes) + 1)))
     return runs_sorted, route_id_map
 
 
@@ -135,14 +153,14 @@ def print_last_run(runs_df, df, max_hops):
 
     last = runs_df.iloc[0]
     run_id = last["id"]
-    sub = df[df["run_id"] == run_id].copy().sort_values("hop")
+    sub = df[df["run_id"] == run_id].sort_values("hop")
     if max_hops:
         sub = sub[sub["hop"] <= max_hops]
 
-    ts = pd.to_datetime(last["ts_utc"], utc=True)
-    print(f"Last run: {ts} UTC | target={last['target']} host={last['host']} exit={last['exit_code']} hops={last['hop_count']}")
+    print(f"Last run: {last['ts']} UTC | target={last['target']} host={last['host']} exit={last['exit_code']} hops={last['hop_count']}")
     for row in sub.itertuples():
-        label = row.hop_host or row.hop_ip or "unknown"
+        # Missing host/IP come back as NaN (truthy), so test for real values.
+        label = next((v for v in (row.hop_host, row.hop_ip) if pd.notna(v) and v), "unknown")
         rtt = row.rtt_avg_ms
         rtt_txt = f"{rtt:.1f} ms" if pd.notna(rtt) else "*"
         status = row.status or "unknown"
@@ -152,59 +170,62 @@ def print_last_run(runs_df, df, max_hops):
 def print_hop_summary(df, max_hops):
     if df.empty:
         return
+    if max_hops:
+        df = df[df["hop"] <= max_hops]
+
+    # One grouped pass per statistic over all hops (and hop/IP pairs), not per-group Python loops.
+    rtt = df["rtt_avg_ms"]
+    timeout = df["status"].eq("timeout")
+    by_hop = rtt.groupby(df["hop"])
+    hop_stats = pd.DataFrame({
+        "median": by_hop.median(),
+        "p95": by_hop.quantile(0.95),
+        "p99": by_hop.quantile(0.99),
+        "timeout": timeout.groupby(df["hop"]).mean() * 100.0,
+    })
+    ip_keys = [df["hop"], df["hop_ip"]]
+    by_ip = rtt.groupby(ip_keys)
+    ip_stats = pd.DataFrame({
+        "n": by_ip.size(),
+        "median": by_ip.median(),
+        "p95": by_ip.quantile(0.95),
+        "p99": by_ip.quantile(0.99),
+        "timeout": timeout.groupby(ip_keys).mean() * 100.0,
+    })
+    hops_with_ip = set(ip_stats.index.get_level_values("hop"))
+    uniq = ip_stats["n"].groupby(level="hop").size()
+    # Most frequent IP per hop; ties go to the IP seen first, as value_counts() does.
+    top_ip = (df.groupby(["hop", "hop_ip"], sort=False).size().reset_index(name="n")
+              .sort_values("n", ascending=False, kind="stable")
+              .drop_duplicates("hop").set_index("hop")["hop_ip"])
+
+    def fmt(val):
+        return f"{val:.1f}" if pd.notna(val) else "NA"
 
-    grouped = df.groupby("hop")
     print()
     print("Hop IP key (all IPs per hop with RTT stats):")
-    for hop, g in grouped:
-        if max_hops and hop > max_hops:
-            continue
-        ip_groups = g.groupby("hop_ip", dropna=True)
+    for hop in hop_stats.index:
         print(f"  Hop {int(hop):2d}:")
-        if ip_groups.ngroups == 0:
+        if hop not in hops_with_ip:
             print("    NA (no IPs recorded)")
             continue
-        stats = []
-        for ip, ig in ip_groups:
-            rtts = ig["rtt_avg_ms"].dropna()
-            median = rtts.median() if not rtts.empty else None
-            p95 = rtts.quantile(0.95) if not rtts.empty else None
-            p99 = rtts.quantile(0.99) if not rtts.empty else None
-            timeout_rate = (ig["status"] == "timeout").mean() * 100.0
-            stats.append((len(ig), ip, median, p95, p99, timeout_rate))
-
-        for count, ip, median, p95, p99, timeout_rate in sorted(stats, key=lambda s: s[0], reverse=True):
-            ip_label = str(ip)
-            med_txt = f"{median:.1f}" if median is not None else "NA"
-            p95_txt = f"{p95:.1f}" if p95 is not None else "NA"
-            p99_txt = f"{p99:.1f}" if p99 is not None else "NA"
-            print(f"    {ip_label:15s} n={count:3d}  median={med_txt:>6s} ms  "
-                  f"p95={p95_txt:>6s} ms  p99={p99_txt:>6s} ms  timeout={timeout_rate:5.1f}%")
+        for ip, row in ip_stats.loc[hop].sort_values("n", ascending=False, kind="stable").iterrows():
+            print(f"    {str(ip):15s} n={int(row['n']):3d}  median={fmt(row['median']):>6s} ms  "
+                  f"p95={fmt(row['p95']):>6s} ms  p99={fmt(row['p99']):>6s} ms  timeout={row['timeout']:5.1f}%")
 
     print()
     print("Hop summary (median/p95/p99 RTT, timeout rate, unique IPs):")
-    for hop, g in grouped:
-        if max_hops and hop > max_hops:
-            continue
-        rtts = g["rtt_avg_ms"].dropna()
-        median = rtts.median() if not rtts.empty else None
-        p95 = rtts.quantile(0.95) if not rtts.empty else None
-        p99 = rtts.quantile(0.99) if not rtts.empty else None
-        timeout_rate = (g["status"] == "timeout").mean() * 100.0
-        uniq = g["hop_ip"].nunique(dropna=True)
-        top_ip = g["hop_ip"].dropna().value_counts().head(1)
-        top_ip = top_ip.index[0] if not top_ip.empty else ""
-        med_txt = f"{median:.1f}" if median is not None else "NA"
-        p95_txt = f"{p95:.1f}" if p95 is not None else "NA"
-        p99_txt = f"{p99:.1f}" if p99 is not None else "NA"
-        print(f"  {int(hop):2d}  median={med_txt:>6s} ms  p95={p95_txt:>6s} ms  p99={p99_txt:>6s} ms  timeout={timeout_rate:5.1f}%  uniq_ip={uniq:2d}  top_ip={top_ip}")
+    for hop, row in hop_stats.iterrows():
+        print(f"  {int(hop):2d}  median={fmt(row['median']):>6s} ms  p95={fmt(row['p95']):>6s} ms  "
+              f"p99={fmt(row['p99']):>6s} ms  timeout={row['timeout']:5.1f}%  "
+              f"uniq_ip={int(uniq.get(hop, 0)):2d}  top_ip={top_ip.get(hop, '')}")
 
 
 def plot_last_run(runs_df, df, out_path):
     if runs_df.empty or df.empty:
         return False
     last = runs_df.iloc[0]
-    sub = df[df["run_id"] == last["id"]].copy().sort_values("hop")
+    sub = df[df["run_id"] == last["id"]].sort_values("hop")
     if sub.empty:
         return False
 
@@ -213,7 +234,9 @@ def plot_last_run(runs_df, df, out_path):
     ax.plot(sub["hop"], sub["rtt_avg_ms"], marker="o", label="RTT avg (ms)")
     timeouts = sub[sub["status"] == "timeout"]
     if not timeouts.empty:
-        ax.scatter(timeouts["hop"], [0] * len(timeouts), color="tab:red", marker="x", label="timeout")
+        # Same color/size for every marker: plot's marker path, not scatter's per-point mapping.
+        ax.plot(timeouts["hop"].to_numpy(), [0] * len(timeouts), "x", color="tab:red", linestyle="None",
+                label="timeout", rasterized=True)
         ax.legend()
     max_hop = int(sub["hop"].max())
     ax.set_xlim(0.5, max_hop + 0.5)
@@ -230,43 +253,38 @@ def plot_hop_stats(df, title, out_path):
     if df.empty:
         return False
 
-    grouped = df.groupby("hop")
-    stats = grouped["rtt_avg_ms"].agg(
-        median="median",
-        p95=lambda s: s.dropna().quantile(0.95) if not s.dropna().empty else None,
-        p99=lambda s: s.dropna().quantile(0.99) if not s.dropna().empty else None,
-    )
-    timeout_rate = grouped["status"].apply(lambda s: (s == "timeout").mean() * 100.0)
-    stats = stats.join(timeout_rate.rename("timeout_rate"))
-    stats = stats.dropna(subset=["median"], how="all")
-    if stats.empty:
+    # One sort, then split the RTT array at hop boundaries (hops with no RTTs simply don't appear).
+    valid = df.loc[df["rtt_avg_ms"].notna(), ["hop", "rtt_avg_ms"]].sort_values("hop", kind="stable")
+    hop_positions, starts = np.unique(valid["hop"].to_numpy(), return_index=True)
+    if not hop_positions.size:
         return False
+    hop_values = np.split(valid["rtt_avg_ms"].to_numpy(), starts[1:])
+
+    # Median/p95/p99 from one np.quantile call per hop on the already NaN-free arrays.
+    quantiles = np.array([np.quantile(vals, [0.5, 0.95, 0.99]) for vals in hop_values])
+    stats = pd.DataFrame(quantiles, index=hop_positions, columns=["median", "p95", "p99"])
+    timeout_rate = df["status"].eq("timeout").groupby(df["hop"]).mean() * 100.0
+    stats["timeout_rate"] = timeout_rate.reindex(stats.index)
 
     plt.figure(figsize=(10, 4.5))
     ax = plt.gca()
 
     max_hop = int(df["hop"].max())
 
-    hop_values = []
-    hop_positions = []
-    for hop, g in grouped:
-        rtts = g["rtt_avg_ms"].dropna().values
-        if rtts.size == 0:
-            continue
-        hop_values.append(rtts)
-        hop_positions.append(hop)
-    if hop_values:
-        ax.boxplot(
-            hop_values,
-            positions=hop_positions,
-            widths=0.6,
-            patch_artist=True,
-            boxprops={"facecolor": "#d9e7f2", "alpha": 0.6},
-            medianprops={"color": "#1f77b4"},
-            whiskerprops={"color": "#7a7a7a"},
-            capprops={"color": "#7a7a7a"},
-            showfliers=False,
-        )
+    boxes = ax.boxplot(
+        hop_values,
+        positions=hop_positions,
+        widths=0.6,
+        patch_artist=True,
+        boxprops={"facecolor": "#d9e7f2", "edgecolor": "#7a7a7a", "alpha": 0.4},
+        medianprops={"color": "#1f77b4"},
+        whiskerprops={"color": "#7a7a7a"},
+        capprops={"color": "#7a7a7a"},
+        showfliers=False,
+    )
+    # Dense per-hop artwork goes out as one raster in PDF/SVG saves; axes and text stay vector.
+    for art in boxes["boxes"] + boxes["whiskers"] + boxes["caps"] + boxes["medians"]:
+        art.set_rasterized(True)
 
     ax.plot(stats.index, stats["median"], marker="o", label="Median RTT (ms)")
     if stats["p95"].notna().any():
@@ -300,10 +318,12 @@ def print_route_changes(runs_sorted, route_id_map, max_hops):
     print()
     print("Routes (unique hop sequences):")
     route_counts = runs_sorted.groupby("route_id")["id"].count()
+    # Format each distinct route once; runs look their label up by route id.
+    route_labels = {rid: format_route_key(key, max_hops) for key, rid in route_id_map.items()}
     for key, rid in sorted(route_id_map.items(), key=lambda kv: kv[1]):
         count = int(route_counts.get(rid, 0))
         hops = len(key) if key else 0
-        print(f"  route {rid:2d}  runs={count:3d}  hops={hops:2d}  {format_route_key(key, max_hops)}")
+        print(f"  route {rid:2d}  runs={count:3d}  hops={hops:2d}  {route_labels[rid]}")
 
     print()
     if len(route_id_map) <= 1:
@@ -314,7 +334,7 @@ def print_route_changes(runs_sorted, route_id_map, max_hops):
     prev_id = None
     for row in runs_sorted.itertuples():
         if row.route_id != prev_id:
-            label = format_route_key(row.route_key, max_hops)
+            label = route_labels[row.route_id]
             if prev_id is None:
                 print(f"  {row.ts_utc} route_id={row.route_id} (initial) {label}")
             else:
@@ -330,21 +350,19 @@ def main():
     ap.add_argument("--since-hours", type=float, default=24.0, help="How many hours back to include")
     ap.add_argument("--runs", type=int, default=50, help="Max number of runs to load")
     ap.add_argument("--max-hops", type=int, default=30, help="Max hops to print in summaries")
-    ap.add_argument("--out", default="", help="Optional base filename to save figures (adds suffixes)")
+    ap.add_argument("--out", default="", help="Optional base filename to save figures (adds suffixes; .png/.pdf/.svg)")
     ap.add_argument("--export-csv", default="", help="Optional CSV path to export joined hop data")
     args = ap.parse_args()
 
-    con = sqlite3.connect(args.db)
+    con = open_reader(args.db)
     try:
         target = args.target or default_target(con, args.host or None)
+        if not target:
+            print("No traceroute targets found.")
+            return
+        runs_df, df = load_trace_data(con, target, args.host or None, args.since_hours, args.runs)
     finally:
         con.close()
-
-    if not target:
-        print("No traceroute targets found.")
-        return
-
-    runs_df, df = load_trace_data(args.db, target, args.host or None, args.since_hours, args.runs)
     if runs_df.empty or df.empty:
         print("No traceroute runs found for the given filters.")
         return
@@ -359,16 +377,17 @@ def main():
     print_last_run(runs_df, df, args.max_hops)
     print_hop_summary(df, args.max_hops)
 
-    route_keys = build_route_keys(df)
-    runs_sorted, route_id_map = annotate_routes(runs_df, route_keys)
+    route_keys, hop_labels = build_route_keys(df)
+    runs_sorted, route_id_map = annotate_routes(runs_df, route_keys, hop_labels)
     print_route_changes(runs_sorted, route_id_map, args.max_hops)
 
     base = args.out
     def out_path(kind):
         if not base:
             return ""
-        if base.endswith(".png"):
-            return base.replace(".png", f"_{kind}.png")
+        root, ext = os.path.splitext(base)
+        if ext.lower() in (".png", ".pdf", ".svg"):
+            return f"{root}_{kind}{ext}"
         return f"{base}_{kind}.png"
 
     plots_made = 0
@@ -376,12 +395,18 @@ def main():
     title = f"Traceroute hop stats | target={target} host={args.host or 'any'}"
     plots_made += int(plot_hop_stats(df, title, out_path("stats")))
 
+    # Tag hop rows with their route once and sort by it, so each route is a contiguous slice.
+    route_runs = runs_sorted["route_id"].value_counts()
+    row_route = df["run_id"].map(runs_sorted.set_index("id")["route_id"]).to_numpy()
+    order = np.argsort(row_route, kind="stable")
+    by_route = df.iloc[order]
+    row_route = row_route[order]
     for key, rid in sorted(route_id_map.items(), key=lambda kv: kv[1]):
-        run_ids = runs_sorted.loc[runs_sorted["route_id"] == rid, "id"].tolist()
-        route_df = df[df["run_id"].isin(run_ids)]
+        lo, hi = np.searchsorted(row_route, [rid, rid + 1])
+        route_df = by_route.iloc[lo:hi]
         if route_df.empty:
             continue
-        title = f"Route {rid} hop stats | target={target} host={args.host or 'any'} runs={len(run_ids)}"
+        title = f"Route {rid} hop stats | target={target} host={args.host or 'any'} runs={int(route_runs[rid])}"
         plots_made += int(plot_hop_stats(route_df, title, out_path(f"route{rid}")))
 
     if plots_made:
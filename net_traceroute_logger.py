@@ -9,21 +9,33 @@ import argparse
 import ipaddress
 import platform
 import shutil
+import signal
 import socket
 import sqlite3
 import subprocess
+import threading
 import time
 import re
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 
 
-def now_utc_iso():
-    return datetime.now(timezone.utc).isoformat()
+def now_utc_stamp():
+    """Return (ISO-8601 text, integer epoch microseconds) for the same instant."""
+    t = time.time()
+    return datetime.fromtimestamp(t, timezone.utc).isoformat(), int(t * 1_000_000)
 
 
-def _table_has_column(conn, table, col):
-    cur = conn.execute(f"PRAGMA table_info({table});")
-    return any(r[1] == col for r in cur.fetchall())
+def tune_connection(conn):
+    """WAL + NORMAL sync: cheaper commits, and viewers reading the DB don't block the logger."""
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA cache_size=-20000;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA mmap_size=268435456;")
+
+
+def _table_columns(conn, table):
+    return {r[1] for r in conn.execute(f"PRAGMA table_info({table});")}
 
 
 def ensure_schema(conn):
@@ -56,6 +68,7 @@ def ensure_schema(conn):
     );
     """)
 
+    existing = _table_columns(conn, "trace_runs")
     for col, typ in [
         ("tool", "TEXT"),
         ("max_hops", "INTEGER"),
@@ -64,10 +77,19 @@ def ensure_schema(conn):
         ("exit_code", "INTEGER"),
         ("hop_count", "INTEGER"),
         ("raw_output", "TEXT"),
+        ("ts_us", "INTEGER"),
     ]:
-        if not _table_has_column(conn, "trace_runs", col):
+        if col not in existing:
             conn.execute(f"ALTER TABLE trace_runs ADD COLUMN {col} {typ};")
-
+    if "ts_us" not in existing:
+        # One-off backfill so retention can key off the integer column for old runs too.
+        conn.execute("""
+            UPDATE trace_runs
+            SET ts_us = CAST(round((julianday(ts_utc) - 2440587.5) * 86400000000.0) AS INTEGER)
+            WHERE ts_us IS NULL
+        """)
+
+    existing = _table_columns(conn, "trace_hops")
     for col, typ in [
         ("hop_host", "TEXT"),
         ("hop_ip", "TEXT"),
@@ -77,11 +99,14 @@ def ensure_schema(conn):
         ("rtt_avg_ms", "REAL"),
         ("status", "TEXT"),
     ]:
-        if not _table_has_column(conn, "trace_hops", col):
+        if col not in existing:
             conn.execute(f"ALTER TABLE trace_hops ADD COLUMN {col} {typ};")
 
     conn.execute("CREATE INDEX IF NOT EXISTS idx_trace_runs_ts ON trace_runs(ts_utc);")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_trace_runs_target ON trace_runs(target);")
+    # Viewer filters runs by target and reads the newest first.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trace_runs_target_ts ON trace_runs(target, ts_utc);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trace_runs_ts_us ON trace_runs(ts_us);")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_trace_hops_run ON trace_hops(run_id);")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_trace_hops_ip ON trace_hops(hop_ip);")
     conn.commit()
@@ -114,37 +139,74 @@ def _build_command(target, max_hops, timeout_ms, query_count, no_dns, tool_overr
 
 
 def run_traceroute(target, max_hops, timeout_ms, query_count, no_dns, tool_override):
+    """Run the tool, parsing hop lines as they stream in; returns (output, exit_code, err, cmd, hops)."""
     cmd, timeout_s, err = _build_command(target, max_hops, timeout_ms, query_count, no_dns, tool_override)
     if err:
-        return None, None, err, None
+        return None, None, err, None, []
     try:
-        r = subprocess.run(
+        proc = subprocess.Popen(
             cmd,
-            capture_output=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             text=True,
-            timeout=timeout_s,
             errors="replace",
         )
-        output = (r.stdout or "") + ("\n" + r.stderr if r.stderr else "")
-        return output, r.returncode, None, cmd
-    except subprocess.TimeoutExpired as e:
-        output = (e.stdout or "") + ("\n" + e.stderr if e.stderr else "")
-        return output, -1, "timeout", cmd
     except Exception as e:
-        return None, -1, str(e), cmd
+        return None, -1, str(e), cmd, []
+
+    timed_out = threading.Event()
+
+    def _kill():
+        if proc.poll() is None:
+            timed_out.set()
+            proc.kill()
+
+    # stderr drains on its own thread: a tool that fills the stderr pipe can't stall the stdout reader.
+    stderr_parts = []
+    drain = threading.Thread(target=lambda: stderr_parts.append(proc.stderr.read()), daemon=True)
+    drain.start()
+    watchdog = threading.Timer(timeout_s, _kill)
+    watchdog.start()
+    lines = []
+    hops = []
+    try:
+        for line in proc.stdout:
+            lines.append(line)
+            hop = parse_hop_line(line.rstrip("\r\n"))
+            if hop:
+                hops.append(hop)
+        exit_code = proc.wait()
+    finally:
+        watchdog.cancel()
+        if proc.poll() is None:  # Ctrl+C mid-run: don't leave the tool running
+            proc.kill()
+            proc.wait()
+        drain.join(timeout=1.0)
+        proc.stdout.close()
+        proc.stderr.close()
+
+    stderr = "".join(stderr_parts)
+    output = "".join(lines) + ("\n" + stderr if stderr else "")
+    if stderr:
+        hops.extend(parse_hops(stderr))
+    # Only a run the watchdog actually killed is a timeout; one that exited on its own as the
+    # timer fired keeps its real exit code.
+    killed = exit_code == -signal.SIGKILL if hasattr(signal, "SIGKILL") else True
+    if timed_out.is_set() and killed:
+        return output, -1, "timeout", cmd, hops
+    return output, exit_code, None, cmd, hops
 
 
 _RTT_RE = re.compile(r"(<)?(\d+(?:\.\d+)?)\s*ms", re.IGNORECASE)
+_HOP_RE = re.compile(r"^\s*(\d+)\s+")
+_IP_BRACKET_RE = re.compile(r"\[(?P<ip>[^\]]+)\]\s*$")
+_IP_PAREN_RE = re.compile(r"\((?P<ip>[^)]+)\)")
+_TIMEOUT_RE = re.compile(r"timed out|timeout", re.IGNORECASE)
 
 
 def _parse_rtts(line):
-    rtts = []
-    for m in _RTT_RE.finditer(line):
-        val = float(m.group(2))
-        if m.group(1):
-            val = max(val * 0.5, 0.1)
-        rtts.append(val)
-    return rtts
+    # findall yields (lt, value) tuples: no Match object per RTT.
+    return [max(float(v) * 0.5, 0.1) if lt else float(v) for lt, v in _RTT_RE.findall(line)]
 
 
 def _strip_hop_prefix(prefix):
@@ -164,19 +226,23 @@ def _host_from_tail(prefix):
 
 
 def _parse_host_ip(line):
-    m = re.search(r"\[(?P<ip>[^\]]+)\]\s*$", line)
+    # Cheap substring checks first: most lines need at most one of the regex searches.
+    m = _IP_BRACKET_RE.search(line) if "]" in line else None
     if m:
         ip = m.group("ip").strip()
         host = _host_from_tail(line[:m.start()].strip())
         return host, ip
 
-    m = re.search(r"\((?P<ip>[^)]+)\)", line)
+    m = _IP_PAREN_RE.search(line) if "(" in line else None
     if m:
         ip = m.group("ip").strip()
         host = _strip_hop_prefix(line[:m.start()].strip())
         return host, ip
 
-    for tok in re.split(r"\s+", line.strip()):
+    for tok in line.split():
+        # Only dotted/colon tokens can be addresses; skip the ValueError for "ms", "*", numbers.
+        if "." not in tok and ":" not in tok:
+            continue
         try:
             ipaddress.ip_address(tok)
             return None, tok
@@ -186,8 +252,7 @@ def _parse_host_ip(line):
 
 
 def _hop_status(line, rtts):
-    text = line.lower()
-    if "timed out" in text or "timeout" in text:
+    if _TIMEOUT_RE.search(line):
         return "timeout"
     if "*" in line and not rtts:
         return "timeout"
@@ -196,68 +261,63 @@ def _hop_status(line, rtts):
     return "unknown"
 
 
+def parse_hop_line(line):
+    """Hop dict for one traceroute/tracert output line, or None if it isn't a hop line."""
+    m = _HOP_RE.match(line)
+    if not m:
+        return None
+    rtts = _parse_rtts(line)
+    host, ip = _parse_host_ip(line)
+    return {
+        "hop": int(m.group(1)),
+        "hop_host": host,
+        "hop_ip": ip,
+        "rtt_ms1": rtts[0] if len(rtts) > 0 else None,
+        "rtt_ms2": rtts[1] if len(rtts) > 1 else None,
+        "rtt_ms3": rtts[2] if len(rtts) > 2 else None,
+        "rtt_avg_ms": (sum(rtts) / len(rtts)) if rtts else None,
+        "status": _hop_status(line, rtts),
+    }
+
+
 def parse_hops(output):
     hops = []
     for line in (output or "").splitlines():
-        m = re.match(r"^\s*(\d+)\s+", line)
-        if not m:
-            continue
-        hop = int(m.group(1))
-        rtts = _parse_rtts(line)
-        host, ip = _parse_host_ip(line)
-        rtt1 = rtts[0] if len(rtts) > 0 else None
-        rtt2 = rtts[1] if len(rtts) > 1 else None
-        rtt3 = rtts[2] if len(rtts) > 2 else None
-        rtt_avg = (sum(rtts) / len(rtts)) if rtts else None
-        hops.append({
-            "hop": hop,
-            "hop_host": host,
-            "hop_ip": ip,
-            "rtt_ms1": rtt1,
-            "rtt_ms2": rtt2,
-            "rtt_ms3": rtt3,
-            "rtt_avg_ms": rtt_avg,
-            "status": _hop_status(line, rtts),
-        })
+        hop = parse_hop_line(line)
+        if hop:
+            hops.append(hop)
     return hops
 
 
-def insert_run(conn, host, ts, target, tool, max_hops, timeout_ms, query_count, exit_code, raw_output, hops):
+def insert_run(conn, host, ts, ts_us, target, tool, max_hops, timeout_ms, query_count, exit_code, raw_output, hops):
     hop_count = len(hops)
     with conn:
         cur = conn.execute("""
         INSERT INTO trace_runs(
-            ts_utc, host, target, tool, max_hops, timeout_ms, query_count, exit_code, hop_count, raw_output
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ts_utc, ts_us, host, target, tool, max_hops, timeout_ms, query_count, exit_code, hop_count, raw_output
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
-            ts, host, target, tool, max_hops, timeout_ms, query_count, exit_code, hop_count, raw_output
+            ts, ts_us, host, target, tool, max_hops, timeout_ms, query_count, exit_code, hop_count, raw_output
         ))
         run_id = cur.lastrowid
-        for hop in hops:
-            conn.execute("""
-            INSERT INTO trace_hops(
-                run_id, hop, hop_host, hop_ip, rtt_ms1, rtt_ms2, rtt_ms3, rtt_avg_ms, status
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                run_id,
-                hop["hop"],
-                hop["hop_host"],
-                hop["hop_ip"],
-                hop["rtt_ms1"],
-                hop["rtt_ms2"],
-                hop["rtt_ms3"],
-                hop["rtt_avg_ms"],
-                hop["status"],
-            ))
+        conn.executemany("""
+        INSERT INTO trace_hops(
+            run_id, hop, hop_host, hop_ip, rtt_ms1, rtt_ms2, rtt_ms3, rtt_avg_ms, status
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (run_id, h["hop"], h["hop_host"], h["hop_ip"], h["rtt_ms1"], h["rtt_ms2"], h["rtt_ms3"],
+             h["rtt_avg_ms"], h["status"])
+            for h in hops
+        ])
     return run_id
 
 
 def prune_old(conn, keep_days):
-    cutoff = datetime.now(timezone.utc) - timedelta(days=keep_days)
-    cutoff_iso = cutoff.isoformat()
+    # Integer comparison on the indexed ts_us column rather than ISO text.
+    cutoff = int((time.time() - keep_days * 86400) * 1_000_000)
     with conn:
-        conn.execute("DELETE FROM trace_hops WHERE run_id IN (SELECT id FROM trace_runs WHERE ts_utc < ?)", (cutoff_iso,))
-        conn.execute("DELETE FROM trace_runs WHERE ts_utc < ?", (cutoff_iso,))
+        conn.execute("DELETE FROM trace_hops WHERE run_id IN (SELECT id FROM trace_runs WHERE ts_us < ?)", (cutoff,))
+        conn.execute("DELETE FROM trace_runs WHERE ts_us < ?", (cutoff,))
 
 
 def main():
@@ -276,13 +336,14 @@ def main():
     args = ap.parse_args()
 
     conn = sqlite3.connect(args.db, timeout=10)
+    tune_connection(conn)
     ensure_schema(conn)
 
     print(f"[net_traceroute_logger] DB={args.db} Target={args.target} Interval={args.interval}s. Ctrl+C to stop.")
     try:
         while True:
-            ts = now_utc_iso()
-            output, exit_code, err, cmd = run_traceroute(
+            ts, ts_us = now_utc_stamp()
+            output, exit_code, err, cmd, hops = run_traceroute(
                 args.target,
                 args.max_hops,
                 args.timeout_ms,
@@ -298,11 +359,11 @@ def main():
                 time.sleep(args.interval)
                 continue
 
-            hops = parse_hops(output or "")
             insert_run(
                 conn,
                 args.host_label,
                 ts,
+                ts_us,
                 args.target,
                 tool,
                 args.max_hops,
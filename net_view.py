@@ -4,72 +4,169 @@ import sqlite3
 from datetime import datetime, timedelta, timezone
 
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 
 
-def load_data(db_path, iface, minutes, host=None):
-    """Load a window of samples for one interface (and optional host)."""
-    since = datetime.now(timezone.utc) - timedelta(minutes=minutes)
+_CORE_COLUMNS = ["ts_utc", "host", "iface"]
+# Columns each chart reads; load_data selects only what the requested charts need.
+_CHART_COLUMNS = {
+    "rates": ["bytes_sent_rate", "bytes_recv_rate"],
+    "packets": ["packets_sent_rate", "packets_recv_rate"],
+    "latency": ["ping_ms", "ping_min_ms", "ping_avg_ms", "ping_max_ms", "ping_jitter_ms", "ping_loss_pct",
+                "dns_ms", "avail_ok"],
+    "throughput": ["thr_down_mbps", "thr_up_mbps", "thr_jitter_ms", "thr_loss_pct", "thr_method"],
+    "errors": ["errin_delta", "errout_delta", "dropin_delta", "dropout_delta",
+               "errin", "errout", "dropin", "dropout"],
+}
+_METRIC_COLUMNS = _CORE_COLUMNS + [c for cols in _CHART_COLUMNS.values() for c in cols]
+_METRIC_DTYPES = {c: "float64" for c in _METRIC_COLUMNS if c not in ("ts_utc", "host", "iface", "thr_method")}
+
+
+def open_reader(db_path):
+    """Read-only connection for repeated window loads (mmap'd pages, larger page cache, memory temp store)."""
     con = sqlite3.connect(db_path)
-    q = """
-      SELECT ts_utc, host, iface,
-             bytes_sent_rate, bytes_recv_rate,
-             packets_sent_rate, packets_recv_rate,
-             ping_ms, ping_min_ms, ping_avg_ms, ping_max_ms, ping_jitter_ms, ping_loss_pct,
-             dns_ms, avail_ok,
-             thr_down_mbps, thr_up_mbps, thr_jitter_ms, thr_loss_pct, thr_method,
-             errin_delta, errout_delta, dropin_delta, dropout_delta,
-             errin, errout, dropin, dropout
+    con.execute("PRAGMA query_only=1;")
+    con.execute("PRAGMA temp_store=MEMORY;")
+    con.execute("PRAGMA mmap_size=268435456;")
+    con.execute("PRAGMA cache_size=-20000;")
+    return con
+
+
+def load_data(con, iface, minutes, host=None, columns=None):
+    """Load a window of samples for one interface (and optional host) over an open reader.
+
+    columns limits the SELECT (default: every metric column).
+    """
+    since = datetime.now(timezone.utc) - timedelta(minutes=minutes)
+    columns = columns or _METRIC_COLUMNS
+    q = "SELECT " + ", ".join(columns) + """
       FROM net_metrics
-      WHERE ts_utc >= ? AND iface = ?
+      WHERE iface = ?
     """
-    params = [since.isoformat(), iface]
+    # Equality columns first, then the time range: matches the logger's (iface, [host,] ts_utc)
+    # indexes so SQLite does an indexed range scan already in ts order (no sort step).
+    params = [iface]
     if host:
         q += " AND host = ?"
         params.append(host)
+    q += " AND ts_utc >= ?"
+    params.append(since.isoformat())
     q += " ORDER BY ts_utc ASC"
-    df = pd.read_sql_query(q, con, params=params)
-    con.close()
+    # Same SQL text on the same connection reuses sqlite3's cached prepared statement.
+    rows = con.execute(q, params).fetchall()
+    # Fixed schema: build the frame straight from the rows and set numeric dtypes up front
+    # (all-NULL columns would otherwise come back as object).
+    dtypes = {c: t for c, t in _METRIC_DTYPES.items() if c in columns}
+    df = pd.DataFrame.from_records(rows, columns=columns).astype(dtypes)
     if df.empty:
         return df
 
-    df["ts"] = pd.to_datetime(df["ts_utc"], utc=True).dt.tz_convert("UTC")
-    df["dt_s"] = df["ts"].diff().dt.total_seconds()
-    df["dt_s"] = df["dt_s"].where(df["dt_s"] > 0, other=pd.NA)
+    df["ts"] = pd.to_datetime(df["ts_utc"], format="ISO8601", utc=True, cache=True)
+    # Sample spacing straight off the datetime64 array (no Timedelta boxing); non-positive -> NaN.
+    dt_s = np.full(len(df), np.nan)
+    dt_s[1:] = np.diff(df["ts"].to_numpy(dtype="datetime64[ns]")) / np.timedelta64(1, "s")
+    df["dt_s"] = np.where(dt_s > 0, dt_s, np.nan)
 
-    # Compute error/drop rates per second using deltas (preferred) or diffs as fallback.
-    for base in ["errin", "errout", "dropin", "dropout"]:
-        delta_col = f"{base}_delta"
-        rate_col = f"{base}_rate"
-        if delta_col in df.columns and df[delta_col].notna().any():
-            df[rate_col] = df[delta_col] / df["dt_s"]
-        elif base in df.columns:
-            df[rate_col] = df[base].diff() / df["dt_s"]
+    # Compute error/drop rates per second using deltas (preferred) or diffs as fallback,
+    # all four counters at once as one (N, 4) block divided by dt_s.
+    bases = ["errin", "errout", "dropin", "dropout"]
+    if not set(_CHART_COLUMNS["errors"]) <= set(columns):
+        return df
+    deltas = df[[f"{b}_delta" for b in bases]].to_numpy(dtype="f8")
+    totals = df[bases].to_numpy(dtype="f8")
+    diffs = np.full_like(totals, np.nan)
+    diffs[1:] = totals[1:] - totals[:-1]
+    use_delta = ~np.isnan(deltas).all(axis=0)
+    counts = np.where(use_delta, deltas, diffs)
+    rates = counts / df["dt_s"].to_numpy()[:, None]
+    df[[f"{b}_rate" for b in bases]] = rates
 
     return df
 
 
-def maybe_save_or_show(path):
-    plt.tight_layout()
-    if path:
-        plt.savefig(path, dpi=130)
-        plt.close()
-    else:
-        plt.show()
-
-
-def _availability_shading(ax, df):
+_PLOT_POINTS = 2000  # per-series vertex budget once a window has more than twice this many rows
+
+
+def _lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: indices of n_out points that keep the series' shape."""
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    # First/last points are kept; the rest is split into n_out - 2 equal-count buckets.
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    sizes = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / sizes
+    # Each bucket is scored against the next bucket's mean (the last one against the final point).
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    idx = np.empty(n_out, dtype=np.intp)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - next_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[i] - y[a]))
+        a = lo + int(area.argmax())
+        idx[i + 1] = a
+    return idx
+
+
+def _time_axis(df):
+    """Plot x values, converted once per window: (naive UTC datetime64[ns], seconds since first sample)."""
+    ts = df["ts"].to_numpy(dtype="datetime64[ns]")
+    return ts, (ts - ts[0]) / np.timedelta64(1, "s")
+
+
+def _downsample(times, values, n_out=_PLOT_POINTS):
+    """Thin one series for plotting; NaN gaps in the original still break the line."""
+    ts, secs = times
+    y = np.asarray(values, dtype=float)
+    if len(y) <= 2 * n_out:
+        return ts, y
+    missing = np.isnan(y)
+    valid = np.flatnonzero(~missing)
+    if len(valid) <= n_out:
+        return ts, y
+    keep = valid[_lttb(secs[valid], y[valid], n_out)]
+    # Put a NaN back between kept points that had a gap between them.
+    gaps_before = np.cumsum(missing)
+    gap = np.flatnonzero(gaps_before[keep[1:]] > gaps_before[keep[:-1]]) + 1
+    return np.insert(ts[keep], gap, ts[keep[gap]]), np.insert(y[keep], gap, np.nan)
+
+
+def _downsample_band(times, lower, upper, n_out=_PLOT_POINTS):
+    """Min/max envelope of a band over n_out equal-count buckets."""
+    ts = times[0]
+    lo = np.asarray(lower, dtype=float)
+    hi = np.asarray(upper, dtype=float)
+    if len(lo) <= 2 * n_out:
+        return ts, lo, hi
+    starts = np.linspace(0, len(lo), n_out, endpoint=False).astype(np.intp)
+    with np.errstate(invalid="ignore"):
+        return ts[starts], np.fmin.reduceat(lo, starts), np.fmax.reduceat(hi, starts)
+
+
+def save_figure(fig, path, dpi=130):
+    fig.tight_layout()
+    fig.savefig(path, dpi=dpi)
+    plt.close(fig)
+
+
+def _availability_shading(ax, df, times):
     if "avail_ok" not in df.columns:
         return
-    avail = df["avail_ok"]
-    if avail.isna().all():
+    # Plain ndarray mask for fill_between; nothing to shade (or label) without a failure.
+    failed = df["avail_ok"].to_numpy() == 0
+    if not failed.any():
         return
     ymin, ymax = ax.get_ylim()
     ax.fill_between(
-        df["ts"],
+        times[0],
         ymin,
         ymax,
-        where=avail == 0,
+        where=failed,
         step="post",
         color="red",
         alpha=0.08,
@@ -79,15 +176,15 @@ def _availability_shading(ax, df):
 
 
 def _apply_scale(ax, series_list, scale_type, clip_pct):
-    combined = pd.concat(series_list).dropna()
-    if combined.empty:
-        return
+    combined = np.concatenate([s.to_numpy(dtype="f8") for s in series_list])
+    combined = combined[~np.isnan(combined)]
     if scale_type == "log":
         combined = combined[combined > 0]
-    if combined.empty:
+    if not combined.size:
         return
-    upper = combined.quantile(clip_pct / 100.0) if clip_pct and clip_pct < 100 else combined.max()
-    if not pd.notna(upper) or upper <= 0:
+    # np.quantile selects via partition (no full sort); same linear interpolation as Series.quantile.
+    upper = np.quantile(combined, clip_pct / 100.0) if clip_pct and clip_pct < 100 else combined.max()
+    if not np.isfinite(upper) or upper <= 0:
         return
     if scale_type == "log":
         lower = max(combined.min() * 0.8, 0.1)
@@ -97,61 +194,57 @@ def _apply_scale(ax, series_list, scale_type, clip_pct):
         ax.set_ylim(0, upper * 1.1)
 
 
-def plot_byte_rates(df, iface, host, minutes, out_path, scale_type, clip_pct):
-    plt.figure(figsize=(10, 4.5))
-    plt.plot(df["ts"], df["bytes_sent_rate"], label="Up (bytes/s)")
-    plt.plot(df["ts"], df["bytes_recv_rate"], label="Down (bytes/s)")
-    _apply_scale(plt.gca(), [df["bytes_sent_rate"], df["bytes_recv_rate"]], scale_type, clip_pct)
-    plt.title(f"Byte Rates | iface={iface} host={host or 'any'} | last {minutes} min")
-    plt.xlabel("Time (UTC)")
-    plt.ylabel("Bytes per second")
-    plt.legend()
-    plt.grid(True)
-    maybe_save_or_show(out_path)
-
-
-def plot_packet_rates(df, iface, host, minutes, out_path, scale_type, clip_pct):
-    plt.figure(figsize=(10, 4.5))
-    plt.plot(df["ts"], df["packets_sent_rate"], label="Packets up (pkts/s)")
-    plt.plot(df["ts"], df["packets_recv_rate"], label="Packets down (pkts/s)")
-    _apply_scale(plt.gca(), [df["packets_sent_rate"], df["packets_recv_rate"]], scale_type, clip_pct)
-    plt.title(f"Packet Rates | iface={iface} host={host or 'any'} | last {minutes} min")
-    plt.xlabel("Time (UTC)")
-    plt.ylabel("Packets per second")
-    plt.legend()
-    plt.grid(True)
-    maybe_save_or_show(out_path)
-
-
-def plot_latency(df, iface, host, minutes, out_path):
-    plt.figure(figsize=(10, 5))
-    ax = plt.gca()
+def plot_byte_rates(ax, df, times, iface, host, minutes, scale_type, clip_pct):
+    ax.plot(*_downsample(times, df["bytes_sent_rate"]), label="Up (bytes/s)")
+    ax.plot(*_downsample(times, df["bytes_recv_rate"]), label="Down (bytes/s)")
+    _apply_scale(ax, [df["bytes_sent_rate"], df["bytes_recv_rate"]], scale_type, clip_pct)
+    ax.set_title(f"Byte Rates | iface={iface} host={host or 'any'} | last {minutes} min")
+    ax.set_xlabel("Time (UTC)")
+    ax.set_ylabel("Bytes per second")
+    ax.legend()
+    ax.grid(True)
+    return True
+
+
+def plot_packet_rates(ax, df, times, iface, host, minutes, scale_type, clip_pct):
+    ax.plot(*_downsample(times, df["packets_sent_rate"]), label="Packets up (pkts/s)")
+    ax.plot(*_downsample(times, df["packets_recv_rate"]), label="Packets down (pkts/s)")
+    _apply_scale(ax, [df["packets_sent_rate"], df["packets_recv_rate"]], scale_type, clip_pct)
+    ax.set_title(f"Packet Rates | iface={iface} host={host or 'any'} | last {minutes} min")
+    ax.set_xlabel("Time (UTC)")
+    ax.set_ylabel("Packets per second")
+    ax.legend()
+    ax.grid(True)
+    return True
+
+
+def plot_latency(ax, df, times, iface, host, minutes):
     plotted = False
 
     if "ping_avg_ms" in df.columns:
-        ax.plot(df["ts"], df["ping_avg_ms"], label="Ping avg (ms)", color="tab:blue")
+        ax.plot(*_downsample(times, df["ping_avg_ms"]), label="Ping avg (ms)", color="tab:blue")
         plotted = True
         if "ping_min_ms" in df.columns and "ping_max_ms" in df.columns:
-            ax.fill_between(df["ts"], df["ping_min_ms"], df["ping_max_ms"],
+            ax.fill_between(*_downsample_band(times, df["ping_min_ms"], df["ping_max_ms"]),
                             color="tab:blue", alpha=0.1, label="Ping min/max")
     elif "ping_ms" in df.columns:
-        ax.plot(df["ts"], df["ping_ms"], label="Ping (ms)", color="tab:blue")
+        ax.plot(*_downsample(times, df["ping_ms"]), label="Ping (ms)", color="tab:blue")
         plotted = True
 
     if "ping_jitter_ms" in df.columns:
-        ax.plot(df["ts"], df["ping_jitter_ms"], label="Ping jitter (ms)", color="tab:green", linestyle="--")
+        ax.plot(*_downsample(times, df["ping_jitter_ms"]), label="Ping jitter (ms)", color="tab:green", linestyle="--")
 
     if "dns_ms" in df.columns:
-        ax.plot(df["ts"], df["dns_ms"], label="DNS lookup (ms)", color="tab:orange", linestyle=":")
+        ax.plot(*_downsample(times, df["dns_ms"]), label="DNS lookup (ms)", color="tab:orange", linestyle=":")
         plotted = True
 
     # Show availability failures as shaded regions
-    _availability_shading(ax, df)
+    _availability_shading(ax, df, times)
 
     # Loss on secondary axis
     if "ping_loss_pct" in df.columns and df["ping_loss_pct"].notna().any():
         ax2 = ax.twinx()
-        ax2.plot(df["ts"], df["ping_loss_pct"], color="tab:red", alpha=0.5, label="Ping loss (%)")
+        ax2.plot(*_downsample(times, df["ping_loss_pct"]), color="tab:red", alpha=0.5, label="Ping loss (%)")
         ax2.set_ylabel("Loss %")
         handles1, labels1 = ax.get_legend_handles_labels()
         handles2, labels2 = ax2.get_legend_handles_labels()
@@ -163,28 +256,26 @@ def plot_latency(df, iface, host, minutes, out_path):
     ax.set_xlabel("Time (UTC)")
     ax.set_ylabel("Milliseconds")
     ax.grid(True)
-    maybe_save_or_show(out_path)
+    return True
 
 
-def plot_throughput(df, iface, host, minutes, out_path):
+def plot_throughput(ax, df, times, iface, host, minutes):
     if "thr_down_mbps" not in df.columns and "thr_up_mbps" not in df.columns:
-        return
+        return False
 
-    plt.figure(figsize=(10, 5))
-    ax = plt.gca()
     if "thr_down_mbps" in df.columns:
-        ax.plot(df["ts"], df["thr_down_mbps"], marker="o", label="Down (Mb/s)", linestyle="-")
+        ax.plot(times[0], df["thr_down_mbps"], marker="o", label="Down (Mb/s)", linestyle="-")
     if "thr_up_mbps" in df.columns:
-        ax.plot(df["ts"], df["thr_up_mbps"], marker="o", label="Up (Mb/s)", linestyle="-")
+        ax.plot(times[0], df["thr_up_mbps"], marker="o", label="Up (Mb/s)", linestyle="-")
 
     # Throughput quality on secondary axis
     ax2 = ax.twinx()
     has_quality = False
     if "thr_jitter_ms" in df.columns and df["thr_jitter_ms"].notna().any():
-        ax2.plot(df["ts"], df["thr_jitter_ms"], color="tab:purple", linestyle="--", label="Jitter (ms)")
+        ax2.plot(times[0], df["thr_jitter_ms"], color="tab:purple", linestyle="--", label="Jitter (ms)")
         has_quality = True
     if "thr_loss_pct" in df.columns and df["thr_loss_pct"].notna().any():
-        ax2.plot(df["ts"], df["thr_loss_pct"], color="tab:red", linestyle=":", label="Loss (%)")
+        ax2.plot(times[0], df["thr_loss_pct"], color="tab:red", linestyle=":", label="Loss (%)")
         ax2.set_ylabel("Jitter/Loss")
         has_quality = True
     else:
@@ -198,11 +289,15 @@ def plot_throughput(df, iface, host, minutes, out_path):
             "iperf3-bidir": "tab:green",
             "http": "tab:purple",
         }
-        for method, group in df.groupby(df["thr_method"].fillna("unknown")):
-            ax.scatter(group["ts"], group.get("thr_down_mbps"), label=f"{method} down", alpha=0.7,
-                       color=method_colors.get(method, "gray"), marker="o")
-            ax.scatter(group["ts"], group.get("thr_up_mbps"), label=f"{method} up", alpha=0.7,
-                       color=method_colors.get(method, "gray"), marker="^")
+        # One scatter per direction with a per-point color array; empty scatters carry the legend.
+        codes, methods = pd.factorize(df["thr_method"].fillna("unknown"), sort=True)
+        palette = np.array([method_colors.get(method, "gray") for method in methods])
+        colors = palette[codes]
+        ax.scatter(times[0], df["thr_down_mbps"], color=colors, alpha=0.7, marker="o")
+        ax.scatter(times[0], df["thr_up_mbps"], color=colors, alpha=0.7, marker="^")
+        for method, color in zip(methods, palette):
+            ax.scatter([], [], label=f"{method} down", alpha=0.7, color=color, marker="o")
+            ax.scatter([], [], label=f"{method} up", alpha=0.7, color=color, marker="^")
 
     handles1, labels1 = ax.get_legend_handles_labels()
     handles2, labels2 = ax2.get_legend_handles_labels()
@@ -212,29 +307,25 @@ def plot_throughput(df, iface, host, minutes, out_path):
     ax.set_xlabel("Time (UTC)")
     ax.set_ylabel("Mb/s")
     ax.grid(True)
-    maybe_save_or_show(out_path)
+    return True
 
 
-def plot_errors(df, iface, host, minutes, out_path):
+def plot_errors(ax, df, times, iface, host, minutes):
     rate_cols = ["errin_rate", "errout_rate", "dropin_rate", "dropout_rate"]
     if not any(c in df.columns for c in rate_cols):
-        return
-    plt.figure(figsize=(10, 4.5))
-    if "errin_rate" in df.columns:
-        plt.plot(df["ts"], df["errin_rate"], label="errin (/s)")
-    if "errout_rate" in df.columns:
-        plt.plot(df["ts"], df["errout_rate"], label="errout (/s)")
-    if "dropin_rate" in df.columns:
-        plt.plot(df["ts"], df["dropin_rate"], label="dropin (/s)")
-    if "dropout_rate" in df.columns:
-        plt.plot(df["ts"], df["dropout_rate"], label="dropout (/s)")
-    _apply_scale(plt.gca(), [df[c] for c in rate_cols if c in df.columns], "linear", 99.5)
-    plt.title(f"Error/Drop Rates | iface={iface} host={host or 'any'} | last {minutes} min")
-    plt.xlabel("Time (UTC)")
-    plt.ylabel("Events per second")
-    plt.legend()
-    plt.grid(True)
-    maybe_save_or_show(out_path)
+        return False
+    labels = {"errin_rate": "errin (/s)", "errout_rate": "errout (/s)",
+              "dropin_rate": "dropin (/s)", "dropout_rate": "dropout (/s)"}
+    present = [c for c in rate_cols if c in df.columns]
+    for c in present:
+        ax.plot(*_downsample(times, df[c]), label=labels[c])
+    _apply_scale(ax, [df[c] for c in present], "linear", 99.5)
+    ax.set_title(f"Error/Drop Rates | iface={iface} host={host or 'any'} | last {minutes} min")
+    ax.set_xlabel("Time (UTC)")
+    ax.set_ylabel("Events per second")
+    ax.legend()
+    ax.grid(True)
+    return True
 
 
 def main():
@@ -244,12 +335,31 @@ def main():
     ap.add_argument("--host", default="", help="Optional host label filter")
     ap.add_argument("--minutes", type=int, default=240, help="How many minutes back to show")
     ap.add_argument("--out", default="", help="Optional base filename to save figures (adds suffixes)")
+    ap.add_argument("--dpi", type=int, default=130, help="Resolution of saved PNGs (lower renders faster)")
     ap.add_argument("--export-csv", default="", help="Optional CSV path to export the windowed data")
     ap.add_argument("--rate-scale", choices=["linear", "log"], default="linear", help="Scale for byte/packet rate charts")
     ap.add_argument("--rate-clip", type=float, default=99.5, help="Percentile to cap rate Y-axis (e.g., 99, 99.5, 100 for none)")
     args = ap.parse_args()
 
-    df = load_data(args.db, args.iface, args.minutes, host=args.host or None)
+    host = args.host or "any"
+    # (kind, height, draw): each draw(ax) fills one chart once df/times are loaded below.
+    charts = [
+        # ("rates", 4.5, lambda ax: plot_byte_rates(ax, df, times, args.iface, host, args.minutes, args.rate_scale, args.rate_clip)),
+        # ("packets", 4.5, lambda ax: plot_packet_rates(ax, df, times, args.iface, host, args.minutes, args.rate_scale, args.rate_clip)),
+        ("latency", 5, lambda ax: plot_latency(ax, df, times, args.iface, host, args.minutes)),
+        ("throughput", 5, lambda ax: plot_throughput(ax, df, times, args.iface, host, args.minutes)),
+        # ("errors", 4.5, lambda ax: plot_errors(ax, df, times, args.iface, host, args.minutes)),
+    ]
+    # Read only the charted columns unless the full window is being exported.
+    columns = None
+    if not args.export_csv:
+        columns = _CORE_COLUMNS + [c for kind, _, _ in charts for c in _CHART_COLUMNS[kind]]
+
+    con = open_reader(args.db)
+    try:
+        df = load_data(con, args.iface, args.minutes, host=args.host or None, columns=columns)
+    finally:
+        con.close()
     if df.empty:
         print("No rows found for the given window/interface.")
         return
@@ -266,11 +376,27 @@ def main():
             return base.replace(".png", f"_{kind}.png")
         return f"{base}_{kind}.png"
 
-    # plot_byte_rates(df, args.iface, args.host or "any", args.minutes, out_path("rates"), args.rate_scale, args.rate_clip)
-    # plot_packet_rates(df, args.iface, args.host or "any", args.minutes, out_path("packets"), args.rate_scale, args.rate_clip)
-    plot_latency(df, args.iface, args.host or "any", args.minutes, out_path("latency"))
-    plot_throughput(df, args.iface, args.host or "any", args.minutes, out_path("throughput"))
-    # plot_errors(df, args.iface, args.host or "any", args.minutes, out_path("errors"))
+    times = _time_axis(df)
+
+    if base:
+        # Saving keeps one PNG per chart; files only, so skip GUI backend start-up.
+        plt.switch_backend("Agg")
+        for kind, height, draw in charts:
+            fig, ax = plt.subplots(figsize=(10, height))
+            if draw(ax):
+                save_figure(fig, out_path(kind), args.dpi)
+            else:
+                plt.close(fig)
+        return
+
+    # Interactive: one window with the charts stacked on a shared time axis.
+    fig, axes = plt.subplots(len(charts), 1, sharex=True, squeeze=False,
+                             figsize=(10, sum(height for _, height, _ in charts)))
+    for ax, (_, _, draw) in zip(axes[:, 0], charts):
+        if not draw(ax):
+            ax.set_visible(False)
+    fig.tight_layout()
+    plt.show()
 
 
 if __name__ == "__main__":